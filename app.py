@@ -1,9 +1,12 @@
-import requests
 import random
 import os
-import json
 from datetime import datetime, timedelta
-from requests_oauthlib import OAuth1Session
+
+from common import http_client, media, metrics
+from common.cache import TTLCache
+from common.history_store import PostHistory
+from common.near_duplicates import SimHashIndex, is_near, simhash
+from common.pipeline import Pipeline, Stage
 
 # Twitter API configurations
 TWITTER_ACCOUNTS = {
@@ -23,8 +26,34 @@ TWITTER_ACCOUNTS = {
 
 # CryptoCompare API configurations
 API_KEY = "1048c9d7ef0df6358f984e6be9466c9b5d83eb5f26a0a57741be7f3f7bd6eb03"
-NEWS_URL = "https://min-api.cryptocompare.com/data/v2/news/"
-SIGNAL_URL = "https://min-api.cryptocompare.com/data/tradingsignals/intotheblock/latest"
+CRYPTOCOMPARE_API = os.environ.get('CRYPTOCOMPARE_API', 'https://min-api.cryptocompare.com')
+NEWS_URL = f"{CRYPTOCOMPARE_API}/data/v2/news/"
+SIGNAL_URL = f"{CRYPTOCOMPARE_API}/data/tradingsignals/intotheblock/latest"
+
+# Twitter API endpoints
+TWITTER_API = os.environ.get('TWITTER_API', 'https://api.twitter.com')
+TWEETS_URL = f"{TWITTER_API}/2/tweets"
+
+# Symbols to fetch IntoTheBlock signals for, and how many requests may run at once
+SIGNAL_SYMBOLS = [
+    symbol.strip().upper()
+    for symbol in os.environ.get('SIGNAL_SYMBOLS', 'BTC,ETH').split(',')
+    if symbol.strip()
+]
+SIGNAL_CONCURRENCY = int(os.environ.get('SIGNAL_CONCURRENCY', '16'))
+
+# Media uploads and tweets that may be in flight at once; tweets default to
+# one at a time so they appear in publication order
+MEDIA_CONCURRENCY = int(os.environ.get('MEDIA_CONCURRENCY', '4'))
+PUBLISH_CONCURRENCY = int(os.environ.get('PUBLISH_CONCURRENCY', '1'))
+
+# News articles posted per run, oldest unseen first, and how many feed pages
+# may be walked back to reach the last article seen
+NEWS_PER_RUN = int(os.environ.get('NEWS_PER_RUN', '5'))
+NEWS_MAX_PAGES = int(os.environ.get('NEWS_MAX_PAGES', '3'))
+
+# Per account, (published_on, id) of the newest article already processed
+_news_cursor = TTLCache('news_cursor', 30 * 24 * 3600)
 
 # Emoji mappings for trading sentiment
 SENTIMENT_EMOJIS = {
@@ -35,52 +64,80 @@ SENTIMENT_EMOJIS = {
 
 class TwitterBot:
     def __init__(self):
-        self.posts_history = self.load_posts_history()
-
-    def load_posts_history(self):
-        """Load post history from a file."""
-        try:
-            if os.path.exists('post_history.json'):
-                with open('post_history.json', 'r') as file:
-                    return json.load(file)
-        except Exception as e:
-            print(f"Error loading post history: {e}")
-        return {'account1': {}, 'account2': {}}
+        self.history = PostHistory()
+        self.title_indexes = {}
+        self.auth_sessions = {}
 
-    def save_posts_history(self):
-        """Save updated post history to a file."""
-        try:
-            with open('post_history.json', 'w') as file:
-                json.dump(self.posts_history, file, indent=2)
-            print("Post history saved successfully.")
-        except Exception as e:
-            print(f"Error saving post history: {e}")
+    @metrics.timed('fetch_news')
+    def fetch_news(self, before=None):
+        """Fetch latest news articles, optionally only those published before a timestamp.
 
-    def fetch_news(self):
-        """Fetch latest news articles."""
+        Returns None when the request fails, so callers can tell a failure
+        from an empty page.
+        """
         try:
             params = {'api_key': API_KEY, 'sortOrder': 'latest'}
-            response = requests.get(NEWS_URL, params=params)
-            response.raise_for_status()
-            return response.json().get('Data', [])
+            if before:
+                params['lTs'] = before
+            return http_client.get_json(NEWS_URL, params=params).get('Data', [])
         except Exception as e:
             print(f"Error fetching news: {e}")
-            return []
+            return None
 
-    def fetch_trading_signal(self, symbol):
-        """Fetch the latest trading signal for a given symbol."""
-        try:
-            url = f"{SIGNAL_URL}?fsym={symbol}&api_key={API_KEY}"
-            response = requests.get(url)
-            response.raise_for_status()
-            return response.json().get('Data', {})
-        except Exception as e:
-            print(f"Error fetching trading signal: {e}")
-            return {}
+    @staticmethod
+    def news_key(article):
+        """Order articles by publication time, then id."""
+        return (int(article.get('published_on') or 0), str(article.get('id')))
+
+    @metrics.timed('fetch_new_articles')
+    def fetch_new_articles(self, cursor):
+        """Return articles newer than cursor, oldest first, and whether the cursor was reached.
+
+        CryptoCompare has no "newer than" filter, so the latest page is fetched
+        conditionally (an unchanged feed costs a 304 and no parse) and older
+        pages are requested with lTs only while a whole page is still unseen.
+        Without a cursor only the latest page is considered. When
+        NEWS_MAX_PAGES pages are all unseen the cursor was not reached, and
+        articles between it and the oldest page fetched are missing. If any
+        page request fails no articles are returned and the cursor is reported
+        as not reached, so the caller leaves it for the next run to retry.
+        """
+        articles = {}
+        before = None
+        reached = False
+        for _ in range(NEWS_MAX_PAGES):
+            page = self.fetch_news(before)
+            if page is None:
+                return [], False
+            fresh = [a for a in page if cursor is None or self.news_key(a) > cursor]
+            # Pages can overlap on the boundary timestamp
+            articles.update((str(a.get('id')), a) for a in fresh)
+            if cursor is None or not page or len(fresh) < len(page):
+                reached = True
+                break
+            before = min(self.news_key(a)[0] for a in page)
+        metrics.incr('news_new_articles', len(articles))
+        return sorted(articles.values(), key=self.news_key), reached
+
+    def load_news_cursor(self, account_key):
+        """Return the (published_on, id) of the account's newest processed article, if any."""
+        cursor = _news_cursor.get(account_key)
+        return tuple(cursor) if cursor else None
+
+    def save_news_cursor(self, account_key, article):
+        """Record article as the newest one processed for the account."""
+        _news_cursor.set(account_key, list(self.news_key(article)))
+
+    def request_trading_signal(self, symbol):
+        """Request the latest trading signal for a symbol, raising on failure."""
+        params = {'fsym': symbol, 'api_key': API_KEY}
+        return http_client.get_json(SIGNAL_URL, params=params).get('Data', {})
+
+    def get_auth_session(self, account_key):
+        """Return a pooled OAuth session for the account, reused across tweets."""
+        if account_key not in self.auth_sessions:
+            from requests_oauthlib import OAuth1Session
 
-    def post_tweet(self, content, account_key, image_url=None):
-        """Post a tweet with optional media."""
-        try:
             account = TWITTER_ACCOUNTS[account_key]
             auth = OAuth1Session(
                 account['consumer_key'],
@@ -88,14 +145,20 @@ class TwitterBot:
                 resource_owner_key=account['access_token'],
                 resource_owner_secret=account['access_token_secret']
             )
+            self.auth_sessions[account_key] = http_client.configure_session(auth)
+        return self.auth_sessions[account_key]
+
+    @metrics.timed('post_tweet')
+    def post_tweet(self, content, account_key, media_id=None):
+        """Post a tweet, attaching already uploaded media if media_id is given."""
+        try:
+            auth = self.get_auth_session(account_key)
 
             payload = {'text': content}
-            if image_url:
-                media_id = self.upload_media_from_url(image_url, auth)
-                if media_id:
-                    payload['media'] = {'media_ids': [media_id]}
+            if media_id:
+                payload['media'] = {'media_ids': [media_id]}
 
-            response = auth.post("https://api.twitter.com/2/tweets", json=payload)
+            response = auth.post(TWEETS_URL, json=payload)
             response.raise_for_status()
             print(f"Successfully posted: {content}")
             return response
@@ -103,34 +166,51 @@ class TwitterBot:
             print(f"Error posting tweet: {e}")
             return None
 
+    @metrics.timed('upload_media')
     def upload_media_from_url(self, image_url, auth):
         """Upload media to Twitter from a URL."""
         try:
-            image_data = requests.get(image_url).content
-            response = auth.post(
-                'https://upload.twitter.com/1.1/media/upload.json',
-                files={'media': image_data}
-            )
-            response.raise_for_status()
-            return response.json().get('media_id_string')
+            return media.upload_from_url(auth, image_url)
         except Exception as e:
             print(f"Error uploading media from URL: {e}")
             return None
 
     def is_duplicate(self, post_id, account_key):
         """Check if a post has been recently posted to avoid duplicates."""
-        try:
-            account_history = self.posts_history.get(account_key, {})
-            if str(post_id) in account_history:
-                return True
-        except Exception as e:
-            print(f"Error checking duplicates: {e}")
+        if self.history.contains(account_key, post_id):
+            metrics.incr('skipped_duplicates', account=account_key)
+            return True
         return False
 
-    def mark_posted(self, post_id, account_key):
-        """Mark a post as posted in the history."""
-        self.posts_history[account_key][str(post_id)] = datetime.now().isoformat()
-        self.save_posts_history()
+    def get_title_index(self, account_key):
+        """Return the account's index of recently posted headlines, loaded on first use."""
+        if account_key not in self.title_indexes:
+            self.title_indexes[account_key] = SimHashIndex(f'news_titles_{account_key}')
+        return self.title_indexes[account_key]
+
+    def is_near_duplicate(self, title, account_key):
+        """Check whether the same headline was recently posted under another id."""
+        if title in self.get_title_index(account_key):
+            metrics.incr('skipped_near_duplicates', account=account_key)
+            return True
+        return False
+
+    def mark_posted(self, post_id, account_key, title=None):
+        """Mark a post as posted; persisted when the run commits its history."""
+        self.history.mark(account_key, post_id)
+        if title:
+            self.get_title_index(account_key).add(title)
+
+    @metrics.timed('save_history')
+    def save_posts_history(self):
+        """Commit this run's history in one transaction."""
+        try:
+            self.history.commit()
+            for index in self.title_indexes.values():
+                index.save()
+            print("Post history saved successfully.")
+        except Exception as e:
+            print(f"Error saving post history: {e}")
 
     def generate_hashtags(self, text, symbol=None):
         """Generate hashtags based on the given text."""
@@ -143,44 +223,143 @@ class TwitterBot:
     def post_updates(self):
         """Post updates to Twitter."""
         print("Starting post updates...")
+        try:
+            self.publish_updates()
+        finally:
+            self.save_posts_history()
+            metrics.write_snapshot()
+
+    def prepare_news(self, news, account_key, pending):
+        """Turn an article into a tweet, or None if it was already posted.
+
+        pending holds title fingerprints queued earlier in this run, so two
+        syndicated copies in one batch are not both posted.
+        """
+        news_id = news.get('id')
+        title = news.get('title')
+        if not title or self.is_duplicate(news_id, account_key):
+            return None
+        # Syndicated copies carry new ids; catch them before any media download.
+        # Titles without a fingerprint (no ASCII words) can only match by id.
+        fingerprint = simhash(title)
+        if fingerprint is not None:
+            if self.is_near_duplicate(title, account_key) or any(is_near(fingerprint, other) for other in pending):
+                return None
+            pending.append(fingerprint)
+
+        hashtags = self.generate_hashtags(title)
+        return {
+            'id': news_id,
+            'title': title,
+            'content': f"{title}\n\n{hashtags}",
+            'image_url': news.get('imageurl'),
+        }
+
+    def prepare_signal(self, symbol):
+        """Fetch a symbol's signal and turn it into a tweet, or None without one."""
+        signal = self.request_trading_signal(symbol)
+        if not signal:
+            return None
 
+        sentiment = signal.get('inOutVar', {}).get('sentiment', 'neutral')
+        emoji = SENTIMENT_EMOJIS.get(sentiment, '🤔')
+        score = signal.get('inOutVar', {}).get('score', 'N/A')
+        return {
+            'id': f"{symbol}_{sentiment}",
+            'content': (
+                f"🚨 {symbol} Trading Signal {emoji}\n"
+                f"Sentiment: {sentiment.capitalize()}\n"
+                f"Score: {score}\n"
+                f"#Crypto #Trading #{symbol}"
+            ),
+        }
+
+    def attach_media(self, tweet, account_key):
+        """Upload the tweet's image, if any; a failed upload posts without media."""
+        if tweet.get('image_url'):
+            tweet['media_id'] = self.upload_media_from_url(tweet['image_url'], self.get_auth_session(account_key))
+        return tweet
+
+    def publish_tweet(self, tweet, account_key):
+        """Post a prepared tweet, returning it on success and None otherwise."""
+        if self.post_tweet(tweet['content'], account_key, media_id=tweet.get('media_id')):
+            return tweet
+        return None
+
+    def tweet_pipeline(self, account_key, *stages):
+        """Build a pipeline that ends by uploading media and posting the tweet."""
+        return Pipeline(
+            *stages,
+            Stage('media', lambda tweet: self.attach_media(tweet, account_key), MEDIA_CONCURRENCY),
+            Stage(
+                'publish',
+                lambda tweet: self.publish_tweet(tweet, account_key),
+                PUBLISH_CONCURRENCY,
+                ordered=PUBLISH_CONCURRENCY == 1,
+            ),
+        )
+
+    def publish_updates(self):
+        """Fetch news and signals and tweet whatever has not been posted yet."""
         # Determine which account to use
         current_minute = datetime.now().minute
         account_key = 'account1' if current_minute % 60 < 30 else 'account2'
         print(f"Using {account_key} for updates.")
 
-        # Fetch and post news
-        news_posts = self.fetch_news()
-        for news in news_posts[:5]:
-            news_id = news.get('id')
-            title = news.get('title')
-            image_url = news.get('imageurl')
-            if not title or self.is_duplicate(news_id, account_key):
-                continue
+        def commit(tweet):
+            self.mark_posted(tweet['id'], account_key, tweet.get('title'))
 
-            hashtags = self.generate_hashtags(title)
-            content = f"{title}\n\n{hashtags}"
-            if self.post_tweet(content, account_key, image_url):
-                self.mark_posted(news_id, account_key)
+        # Post news published since the last run, oldest first
+        cursor = self.load_news_cursor(account_key)
+        articles, reached = self.fetch_new_articles(cursor)
+        if reached and cursor:
+            batch = articles[:NEWS_PER_RUN]
+        else:
+            # A first run, or a cursor too far behind to catch up on: start
+            # from the newest articles instead of posting hours-old news
+            batch = articles[-NEWS_PER_RUN:]
+            behind = articles[:-NEWS_PER_RUN]
+            if cursor and behind:
+                print(
+                    f"News cursor for {account_key} is more than {NEWS_MAX_PAGES} pages behind; "
+                    f"skipping articles from {cursor} up to {self.news_key(behind[-1])} "
+                    f"({len(behind)} fetched, older unfetched ones too)"
+                )
+                metrics.incr('news_articles_skipped', len(behind), account=account_key)
+                # Resume after the gap even if the batch below fails
+                self.save_news_cursor(account_key, behind[-1])
+        pending = []
+        skipped = set()
 
-        # Fetch and post trading signals
-        for symbol in ['BTC', 'ETH']:
-            signal = self.fetch_trading_signal(symbol)
-            if not signal:
-                continue
+        def prepare(article):
+            tweet = self.prepare_news(article, account_key, pending)
+            if tweet is None:
+                skipped.add(self.news_key(article))
+            return tweet
 
-            sentiment = signal.get('inOutVar', {}).get('sentiment', 'neutral')
-            emoji = SENTIMENT_EMOJIS.get(sentiment, '🤔')
-            score = signal.get('inOutVar', {}).get('score', 'N/A')
+        news = self.tweet_pipeline(account_key, Stage('prepare', prepare))
+        outcomes = news.run(batch, commit=commit)
+        for outcome in outcomes:
+            if outcome.error:
+                print(f"Error posting news {outcome.item.get('id')}: {outcome.error}")
 
-            signal_content = (
-                f"🚨 {symbol} Trading Signal {emoji}\n"
-                f"Sentiment: {sentiment.capitalize()}\n"
-                f"Score: {score}\n"
-                f"#Crypto #Trading #{symbol}"
-            )
-            if self.post_tweet(signal_content, account_key):
-                self.mark_posted(f"{symbol}_{sentiment}", account_key)
+        # The cursor only passes articles that were posted or deliberately
+        # skipped; the first failure and everything after it is retried next
+        # run, as is anything past the batch
+        processed = None
+        for outcome in outcomes:
+            posted = outcome.result is not None and outcome.error is None
+            if not posted and self.news_key(outcome.item) not in skipped:
+                break
+            processed = outcome.item
+        if processed:
+            self.save_news_cursor(account_key, processed)
+
+        # Fetch and post trading signals
+        signals = self.tweet_pipeline(account_key, Stage('fetch_signal', self.prepare_signal, SIGNAL_CONCURRENCY))
+        for outcome in signals.run(SIGNAL_SYMBOLS, commit=commit):
+            if outcome.error:
+                print(f"Error fetching trading signal for {outcome.item}: {outcome.error}")
 
 def main():
     bot = TwitterBot()
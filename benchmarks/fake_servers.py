@@ -0,0 +1,317 @@
+"""Local stand-ins for the CryptoCompare, CoinGecko, Twitter and Telegram APIs.
+
+Each fake listens on its own localhost port, answers just enough of the real
+API for the entry points to run, and can inject latency and error responses.
+Every request is counted per route so runs can be compared by request volume.
+"""
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeConfig:
+    """Knobs shared by all fake servers."""
+
+    def __init__(self, latency_ms: float = 50, jitter_ms: float = 10, error_rate: float = 0.0,
+                 news_items: int = 50, trending_items: int = 15, image_bytes: int = 200 * 1024,
+                 seed: Optional[int] = None) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.news_items = news_items
+        self.trending_items = trending_items
+        self.image_bytes = image_bytes
+        self.random = random.Random(seed)
+
+
+Route = Callable[["FakeHandler", Dict[str, Any]], Tuple[int, Any]]
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    server: "FakeServer"
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, every
+    # keep-alive request would stall on the client's delayed ACK.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self, method: str) -> None:
+        parsed = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        params.update(self._form(body))
+
+        route = self.server.match(method, parsed.path)
+        self.server.count(f"{method} {route.__name__.lstrip('_') if route else parsed.path}")
+        config = self.server.config
+        delay = max(0.0, config.latency_ms + config.random.uniform(-config.jitter_ms, config.jitter_ms))
+        time.sleep(delay / 1000)
+
+        if route is None:
+            status, payload = 404, {"error": "not found"}
+        elif config.random.random() < config.error_rate:
+            status, payload = self.server.error_response()
+        else:
+            status, payload = route(self, params)
+
+        if isinstance(payload, bytes):
+            data, content_type = payload, "image/jpeg"
+        else:
+            data, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _form(self, body: bytes) -> Dict[str, Any]:
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return {k: v[-1] for k, v in parse_qs(body.decode("utf-8")).items()}
+        if content_type.startswith("multipart/form-data"):
+            message = BytesParser().parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body
+            )
+            fields = {}
+            for part in message.walk():
+                name = part.get_param("name", header="content-disposition")
+                if name:
+                    fields[name] = part.get_payload(decode=True)
+            return fields
+        if content_type.startswith("application/json") and body:
+            return json.loads(body)
+        return {}
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+class FakeServer(ThreadingHTTPServer):
+    """Threaded HTTP server that routes by path prefix and counts requests."""
+
+    daemon_threads = True
+    routes: Dict[Tuple[str, str], Route] = {}
+
+    def __init__(self, config: FakeConfig) -> None:
+        super().__init__(("127.0.0.1", 0), FakeHandler)
+        self.config = config
+        self.requests: Counter = Counter()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def match(self, method: str, path: str) -> Optional[Route]:
+        for (route_method, prefix), route in self.routes.items():
+            if method == route_method and path.startswith(prefix):
+                return route
+        return None
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.requests[name] += 1
+
+    def error_response(self) -> Tuple[int, Any]:
+        return 503, {"error": "injected failure"}
+
+    def handle_error(self, request, client_address) -> None:
+        # Clients dropping keep-alive connections is expected, not an error.
+        pass
+
+    def start(self) -> "FakeServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def _news(handler: FakeHandler, params: Dict[str, Any]) -> Tuple[int, Any]:
+    config = handler.server.config
+    base = handler.server.url
+    now = int(time.time())
+    articles = [
+        {
+            "id": str(900000 + i),
+            "published_on": now - i * 60,
+            "title": f"Bitcoin market update number {i} as traders watch liquidity",
+            "body": "Lorem ipsum " * 40,
+            "imageurl": f"{base}/images/{i}.jpg",
+            "source": "fake",
+        }
+        for i in range(config.news_items)
+    ]
+    if params.get("lTs"):
+        articles = [article for article in articles if article["published_on"] < int(params["lTs"])]
+    return 200, {"Type": 100, "Message": "News list successfully returned", "Data": articles}
+
+
+def _signal(handler: FakeHandler, params: Dict[str, Any]) -> Tuple[int, Any]:
+    sentiment = handler.server.config.random.choice(["bullish", "bearish", "neutral"])
+    return 200, {"Response": "Success", "Data": {
+        "symbol": params.get("fsym", "BTC"),
+        "inOutVar": {"sentiment": sentiment, "score": round(handler.server.config.random.random(), 3)},
+    }}
+
+
+def _image(handler: FakeHandler, params: Dict[str, Any]) -> Tuple[int, Any]:
+    return 200, b"\xff\xd8" + b"\x00" * max(0, handler.server.config.image_bytes - 2)
+
+
+class FakeCryptoCompare(FakeServer):
+    routes = {
+        ("GET", "/data/v2/news/"): _news,
+        ("GET", "/data/tradingsignals/intotheblock/latest"): _signal,
+        ("GET", "/images/"): _image,
+    }
+
+
+def _coin(config: FakeConfig, rank: int, coin_id: Optional[str] = None) -> Dict[str, Any]:
+    coin_id = coin_id or ("bitcoin" if rank == 1 else "ethereum" if rank == 2 else f"coin-{rank}")
+    price = 100000.0 / rank * config.random.uniform(0.98, 1.02)
+    return {
+        "id": coin_id,
+        "symbol": coin_id[:4],
+        "name": coin_id.title(),
+        "current_price": price,
+        "market_cap": price * 19_000_000,
+        "market_cap_rank": rank,
+        "total_volume": price * 500_000,
+        "price_change_percentage_24h": config.random.uniform(-5, 5),
+        "price_change_percentage_24h_in_currency": config.random.uniform(-5, 5),
+        "price_change_percentage_7d_in_currency": config.random.uniform(-10, 10),
+    }
+
+
+def _markets(handler: FakeHandler, params: Dict[str, Any]) -> Tuple[int, Any]:
+    config = handler.server.config
+    if params.get("ids"):
+        ids = params["ids"].split(",")
+        return 200, [_coin(config, rank, coin_id) for rank, coin_id in enumerate(ids, 1)]
+    per_page = int(params.get("per_page", 100))
+    page = int(params.get("page", 1))
+    first = (page - 1) * per_page + 1
+    return 200, [_coin(config, rank) for rank in range(first, first + per_page)]
+
+
+def _simple_price(handler: FakeHandler, params: Dict[str, Any]) -> Tuple[int, Any]:
+    config = handler.server.config
+    result = {}
+    for rank, coin_id in enumerate(params.get("ids", "").split(","), 1):
+        coin = _coin(config, rank, coin_id)
+        result[coin_id] = {"usd": coin["current_price"], "usd_market_cap": coin["market_cap"]}
+    return 200, result
+
+
+def _trending(handler: FakeHandler, params: Dict[str, Any]) -> Tuple[int, Any]:
+    config = handler.server.config
+    coins = [
+        {"item": {
+            "id": f"trend-{i}",
+            "coin_id": i,
+            "name": f"Trend {i}",
+            "symbol": f"tr{i}",
+            "market_cap_rank": 100 + i,
+            "price_btc": config.random.uniform(1e-10, 1e-5),
+            "slug": f"trend-{i}",
+        }}
+        for i in range(config.trending_items)
+    ]
+    return 200, {"coins": coins}
+
+
+class FakeCoinGecko(FakeServer):
+    routes = {
+        ("GET", "/api/v3/coins/markets"): _markets,
+        ("GET", "/api/v3/simple/price"): _simple_price,
+        ("GET", "/api/v3/search/trending"): _trending,
+    }
+
+    def error_response(self) -> Tuple[int, Any]:
+        return 429, {"status": {"error_code": 429, "error_message": "injected rate limit"}}
+
+
+def _tweet(handler: FakeHandler, params: Dict[str, Any]) -> Tuple[int, Any]:
+    return 201, {"data": {"id": str(handler.server.config.random.randrange(10 ** 18)), "text": params.get("text", "")}}
+
+
+def _media_upload(handler: FakeHandler, params: Dict[str, Any]) -> Tuple[int, Any]:
+    command = params.get("command")
+    if isinstance(command, bytes):
+        command = command.decode("utf-8")
+    if command == "INIT":
+        return 202, {"media_id": 1, "media_id_string": "1", "expires_after_secs": 86400}
+    if command == "APPEND":
+        return 204, b""
+    if command == "FINALIZE":
+        return 201, {"media_id": 1, "media_id_string": "1", "size": 0}
+    return 200, {"media_id": 1, "media_id_string": "1"}
+
+
+class FakeTwitter(FakeServer):
+    routes = {
+        ("POST", "/2/tweets"): _tweet,
+        ("POST", "/1.1/media/upload.json"): _media_upload,
+        ("GET", "/1.1/media/upload.json"): _media_upload,
+    }
+
+
+_telegram_message_ids = itertools.count(1000)
+
+
+def _telegram_message(handler: FakeHandler, params: Dict[str, Any]) -> Tuple[int, Any]:
+    # Edits echo the message id; sends allocate a fresh one
+    message_id = params.get("message_id") or next(_telegram_message_ids)
+    return 200, {"ok": True, "result": {
+        "message_id": int(message_id),
+        "date": int(time.time()),
+        "chat": {"id": int(params.get("chat_id", 1)), "type": "channel"},
+        "text": params.get("text", ""),
+    }}
+
+
+class FakeTelegram(FakeServer):
+    routes = {
+        ("POST", "/bot"): _telegram_message,
+    }
+
+    def error_response(self) -> Tuple[int, Any]:
+        return 500, {"ok": False, "error_code": 500, "description": "Internal Server Error: injected"}
+
+
+def start_all(config: FakeConfig) -> Dict[str, FakeServer]:
+    """Starts one fake per upstream API."""
+    return {
+        "cryptocompare": FakeCryptoCompare(config).start(),
+        "coingecko": FakeCoinGecko(config).start(),
+        "twitter": FakeTwitter(config).start(),
+        "telegram": FakeTelegram(config).start(),
+    }
+
+
+def environment(servers: Dict[str, FakeServer]) -> Dict[str, str]:
+    """Environment variables that point the entry points at the fakes."""
+    return {
+        "CRYPTOCOMPARE_API": servers["cryptocompare"].url,
+        "COINGECKO_API": f"{servers['coingecko'].url}/api/v3",
+        "TWITTER_API": servers["twitter"].url,
+        "TWITTER_UPLOAD_URL": f"{servers['twitter'].url}/1.1/media/upload.json",
+        "TELEGRAM_API_URL": f"{servers['telegram'].url}/bot",
+    }
@@ -0,0 +1,205 @@
+"""Runs the entry points against local fake APIs and reports their cost.
+
+    python -m benchmarks.run --iterations 10 --latency-ms 80 --error-rate 0.05
+
+Each selected job runs in-process. Every iteration gets its own scratch copy
+of ``post/``, cache directory and history, and re-imports the repository's
+modules so no in-memory cache or session survives from the previous
+iteration; repeated runs measure the cold path. The report gives
+latency percentiles and peak traced memory per job plus request counts per
+fake API.
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from benchmarks.fake_servers import FakeConfig, environment, start_all
+from common import metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Credentials the entry points need to get past their own checks.
+FAKE_CREDENTIALS = {
+    "BOT_TOKEN": "123456:fake-benchmark-token-abcdefghijklmno",
+    "CHANNEL_ID": "1",
+    "CONSUMER_KEY": "key",
+    "CONSUMER_SECRET": "secret",
+    "ACCESS_TOKEN": "token",
+    "ACCESS_SECRET": "secret",
+    "ACCESS_TOKEN2": "token2",
+    "ACCESS_SECRET2": "secret2",
+}
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        "runs": len(samples),
+        "p50": metrics.percentile(samples, 50),
+        "p90": metrics.percentile(samples, 90),
+        "p99": metrics.percentile(samples, 99),
+        "max": max(samples, default=0.0),
+    }
+
+
+# Repository modules left loaded between iterations: metrics accumulate
+# across the whole benchmark.
+KEEP_MODULES = frozenset({"common", "common.metrics", "common.profiling"})
+
+
+def _is_repo_module(name: str) -> bool:
+    return name in ("app", "old", "daemon") or name.split(".")[0] in ("common", "post", "updates")
+
+
+def unload_repo_modules() -> None:
+    """Drops the repository's modules so the next import starts from scratch."""
+    for name in [name for name in sys.modules if _is_repo_module(name) and name not in KEEP_MODULES]:
+        del sys.modules[name]
+        # ``from common import x`` would otherwise hand back the old submodule.
+        parent, _, child = name.rpartition(".")
+        if parent in sys.modules:
+            vars(sys.modules[parent]).pop(child, None)
+
+
+def make_jobs(workdir: str) -> Dict[str, Any]:
+    """Prepares a fresh iteration in workdir and returns its entry points.
+
+    The environment and working directory point at workdir before the entry
+    points are imported, since modules read their paths at import time.
+    """
+    shutil.copytree(os.path.join(ROOT, "post"), os.path.join(workdir, "post"))
+    os.environ["CACHE_DIR"] = os.path.join(workdir, ".cache")
+    os.environ["HISTORY_DB"] = os.path.join(workdir, "post_history.db")
+    os.chdir(workdir)
+    unload_repo_modules()
+
+    app = importlib.import_module("app")
+    telegram_bot = importlib.import_module("updates.bot")
+    update_data = importlib.import_module("post.update_data")
+    return {
+        "twitter": lambda: app.TwitterBot().post_updates(),
+        "telegram": telegram_bot.main,
+        "markdown": update_data.main,
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    config = FakeConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        news_items=args.news_items, trending_items=args.trending_items,
+        image_bytes=args.image_kb * 1024, seed=args.seed,
+    )
+    servers = start_all(config)
+    workdir = tempfile.mkdtemp(prefix="tp-bench-")
+    os.environ.update(FAKE_CREDENTIALS)
+    os.environ.update(environment(servers))
+    os.environ.update({
+        "MARKET_DATA_TTL": "0",
+        "PRICE_TOLERANCE_PCT": "0",
+    })
+    if args.symbols:
+        os.environ["SIGNAL_SYMBOLS"] = ",".join(f"S{i}" for i in range(args.symbols))
+
+    previous_cwd = os.getcwd()
+    sys.path.insert(0, ROOT)
+    latencies: Dict[str, List[float]] = {name: [] for name in args.jobs}
+    peaks: Dict[str, int] = {name: 0 for name in args.jobs}
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    metrics.enable()
+    metrics.reset()
+    try:
+        tracemalloc.start()
+        for iteration in range(args.iterations):
+            jobs = make_jobs(os.path.join(workdir, f"run-{iteration}"))
+            if not args.verbose:
+                logging.getLogger().setLevel(logging.WARNING)
+            for name in args.jobs:
+                tracemalloc.reset_peak()
+                start = time.perf_counter()
+                try:
+                    with quiet:
+                        jobs[name]()
+                except Exception as e:
+                    print(f"{name} raised: {e}", file=sys.stderr)
+                latencies[name].append((time.perf_counter() - start) * 1000)
+                peaks[name] = max(peaks[name], tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    finally:
+        os.chdir(previous_cwd)
+        for server in servers.values():
+            server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    recorded = metrics.snapshot()
+    return {
+        "config": {k: v for k, v in vars(args).items() if k != "json"},
+        "stages": recorded["spans"],
+        "counters": recorded["counters"],
+        "jobs": {
+            name: {"latency_ms": summarize(latencies[name]), "peak_memory_bytes": peaks[name]}
+            for name in args.jobs
+        },
+        "requests": {name: dict(server.requests) for name, server in servers.items()},
+    }
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(f"{'job':<10} {'runs':>5} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'peak MiB':>9}")
+    for name, stats in result["jobs"].items():
+        latency = stats["latency_ms"]
+        print(
+            f"{name:<10} {latency['runs']:>5} {latency['p50']:>9.1f} {latency['p90']:>9.1f} "
+            f"{latency['p99']:>9.1f} {latency['max']:>9.1f} {stats['peak_memory_bytes'] / 2 ** 20:>9.2f}"
+        )
+    print(f"\n{'stage':<22} {'count':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, stats in result["stages"].items():
+        print(
+            f"{name:<22} {stats['count']:>6} {stats['p50_ms']:>9.1f} {stats['p90_ms']:>9.1f} "
+            f"{stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f}"
+        )
+    print("\nrequests")
+    for server, counts in result["requests"].items():
+        for route, count in sorted(counts.items()):
+            print(f"  {server:<14} {route:<40} {count:>6}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the entry points against fake APIs.")
+    parser.add_argument("--jobs", nargs="+", choices=["twitter", "telegram", "markdown"],
+                        default=["twitter", "telegram", "markdown"])
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--news-items", type=int, default=50)
+    parser.add_argument("--trending-items", type=int, default=15)
+    parser.add_argument("--image-kb", type=int, default=200)
+    parser.add_argument("--symbols", type=int, default=0,
+                        help="number of synthetic signal symbols (default: SIGNAL_SYMBOLS)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="also write the report as JSON to this path")
+    parser.add_argument("--verbose", action="store_true", help="show the jobs' own output")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    result = run(args)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
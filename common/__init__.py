@@ -0,0 +1 @@
+"""Shared helpers used by the Twitter, Telegram and markdown entry points."""
@@ -0,0 +1,111 @@
+"""Atomic, coalesced writes for the files a run generates."""
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Pattern, Union
+
+from common import metrics
+
+# mkstemp creates files as 0600; new artifacts get the usual 0666 & ~umask
+# instead. Read once, since os.umask can only be read by setting it.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def read_bytes(path: str) -> Optional[bytes]:
+    """Returns the file's contents, or None if it cannot be read."""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _file_mode(path: str) -> int:
+    """Returns the permission bits path has, or those a new file would get."""
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except OSError:
+        return 0o666 & ~_UMASK
+
+
+def atomic_write(path: str, data: Union[str, bytes], durable: bool = True) -> None:
+    """Replaces path with data so readers see either the old or the new file.
+
+    The data goes to a temporary file in the same directory, which is then
+    renamed over path. With durable set the file and directory are fsynced,
+    so a crash cannot leave a truncated file behind; caches that can be
+    rebuilt skip that cost. The replacement keeps path's permissions.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.chmod(tmp_path, _file_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    if durable and hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class ArtifactWriter:
+    """Buffers a run's file updates and writes each file at most once.
+
+    Later writes to a path replace earlier ones. ``flush`` skips files whose
+    bytes already match the disk, ignoring lines matched by a per-file
+    ``ignore`` pattern such as a "last updated" stamp, and writes the rest
+    atomically.
+    """
+
+    def __init__(self) -> None:
+        self._pending: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def write(self, path: str, data: Union[str, bytes], ignore: Optional[Pattern[str]] = None) -> None:
+        """Queues data to be written to path."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._pending.pop(path, None)
+        self._pending[path] = (data, ignore)
+
+    def write_json(self, path: str, value: Any, **dump_kwargs: Any) -> None:
+        """Queues value serialised with json.dumps(value, **dump_kwargs)."""
+        self.write(path, json.dumps(value, **dump_kwargs))
+
+    def flush(self) -> Dict[str, bool]:
+        """Writes every queued file, returning whether each path was written."""
+        written = {}
+        with metrics.span("flush_artifacts"):
+            while self._pending:
+                path, (data, ignore) = self._pending.popitem(last=False)
+                current = read_bytes(path)
+                if current is not None and _significant(current, ignore) == _significant(data, ignore):
+                    metrics.incr("artifact_writes_skipped")
+                    written[path] = False
+                    continue
+                atomic_write(path, data)
+                metrics.incr("artifact_writes")
+                written[path] = True
+        return written
+
+
+def _significant(data: bytes, ignore: Optional[Pattern[str]]) -> Union[str, bytes]:
+    if ignore is None:
+        return data
+    return ignore.sub("", data.decode("utf-8", errors="replace"))
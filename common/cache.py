@@ -0,0 +1,70 @@
+"""Small TTL cache kept in memory and mirrored to a JSON file on disk."""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from common.artifacts import atomic_write
+
+# Directory for caches shared between entry points and runs.
+CACHE_DIR = os.getenv(
+    "CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache"),
+)
+
+
+def make_key(endpoint: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Builds a stable cache key from an endpoint and its query parameters."""
+    return f"{endpoint}?{json.dumps(params or {}, sort_keys=True, separators=(',', ':'))}"
+
+
+class TTLCache:
+    """Maps keys to JSON-serialisable values that expire after ttl seconds.
+
+    Entries live in memory for the lifetime of the process and are written
+    through to ``<CACHE_DIR>/<name>.json`` so a later process started within
+    the TTL can reuse them.
+    """
+
+    def __init__(self, name: str, ttl: float, cache_dir: str = CACHE_DIR) -> None:
+        self.ttl = ttl
+        self.path = os.path.join(cache_dir, f"{name}.json")
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self) -> None:
+        now = time.time()
+        live = {k: v for k, v in self._entries.items() if v["expires"] > now}
+        self._entries = live
+        try:
+            atomic_write(self.path, json.dumps(live, separators=(",", ":")), durable=False)
+        except OSError:
+            # A read-only or full disk only costs us the cross-process reuse.
+            pass
+
+    def get(self, key: str) -> Optional[Any]:
+        """Returns the cached value, or None when missing or expired."""
+        with self._lock:
+            entry = self._load().get(key)
+            if entry and entry["expires"] > time.time():
+                return entry["value"]
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Stores value under key and persists the cache."""
+        with self._lock:
+            self._load()[key] = {
+                "expires": time.time() + (self.ttl if ttl is None else ttl),
+                "value": value,
+            }
+            self._save()
@@ -0,0 +1,291 @@
+"""Record upstream HTTP traffic to a cassette and replay it offline.
+
+With CASSETTE_MODE=record every request made through the shared HTTP
+adapters or the Telegram client is passed through and appended, with its
+timing, to CASSETTE_FILE (gzip-compressed JSON lines). With
+CASSETTE_MODE=replay no network is used: each request is answered from the
+cassette after waiting its recorded duration divided by CASSETTE_SPEED
+(0 answers immediately). Replays should start from the same cache state as
+the recording, e.g. an empty CACHE_DIR, so the entry points make the same
+requests.
+
+Credentials are kept out of cassettes: only response headers are stored,
+API-key query parameters are masked and the Telegram bot token is removed
+from URLs.
+"""
+import atexit
+import base64
+import collections
+import datetime
+import gzip
+import io
+import json
+import os
+import re
+import threading
+import time
+from http import HTTPStatus
+from typing import Any, Deque, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+import urllib3
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from common import metrics
+from common.cache import CACHE_DIR
+
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "").lower()
+CASSETTE_FILE = os.getenv("CASSETTE_FILE", os.path.join(CACHE_DIR, "cassette.jsonl.gz"))
+CASSETTE_SPEED = float(os.getenv("CASSETTE_SPEED", "1"))
+
+RECORD = "record"
+REPLAY = "replay"
+
+SECRET_PARAMS = frozenset({"api_key", "key", "token", "x_cg_demo_api_key", "x_cg_pro_api_key"})
+_BOT_TOKEN = re.compile(r"/bot[^/]+/")
+# Plain multipart fields; file parts carry a filename and are left out.
+_MULTIPART_FIELD = re.compile(rb'Content-Disposition: form-data; name="([^"]+)"\r\n\r\n(.*?)\r\n--', re.S)
+# Describe the stored body, which requests has already decompressed.
+_DROPPED_HEADERS = frozenset({"content-encoding", "content-length", "transfer-encoding", "set-cookie"})
+
+_cassette: Optional["Cassette"] = None
+_cassette_lock = threading.Lock()
+
+
+def redact_url(url: str) -> str:
+    """Masks secrets in a URL's query and path."""
+    parts = urlsplit(_BOT_TOKEN.sub("/bot<token>/", url))
+    query = [(k, "<redacted>" if k.lower() in SECRET_PARAMS else v) for k, v in parse_qsl(parts.query, True)]
+    return parts._replace(query=urlencode(query)).geturl()
+
+
+def form_fields(body: Any, content_type: Any) -> str:
+    """Returns a request's text form fields, sorted and with secrets masked.
+
+    Chunked media uploads POST INIT, APPEND and FINALIZE to one URL and
+    differ only in these fields. Multipart boundaries and file contents are
+    left out, so the result is stable between recording and replay.
+    """
+    if isinstance(content_type, bytes):
+        content_type = content_type.decode("latin-1")
+    content_type = (content_type or "").lower()
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if not isinstance(body, bytes):
+        return ""
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        fields = parse_qsl(body.decode("utf-8", errors="replace"), True)
+    elif content_type.startswith("multipart/form-data"):
+        fields = [(k.decode("utf-8", errors="replace"), v.decode("utf-8", errors="replace"))
+                  for k, v in _MULTIPART_FIELD.findall(body)]
+    else:
+        return ""
+    return urlencode(sorted((k, "<redacted>" if k.lower() in SECRET_PARAMS else v) for k, v in fields))
+
+
+def match_key(source: str, method: str, url: str, form: str = "") -> Tuple[str, str, str, str]:
+    """Identifies a request independent of port, parameter order and secrets."""
+    parts = urlsplit(redact_url(url))
+    query = urlencode(sorted(parse_qsl(parts.query, True)))
+    return source, method.upper(), f"{parts.hostname}{parts.path}?{query}", form
+
+
+class Cassette:
+    """One cassette file opened for recording or replay."""
+
+    def __init__(self, path: str, mode: str, speed: float = CASSETTE_SPEED) -> None:
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"unknown cassette mode {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._file = None
+        self._entries: Dict[Tuple[str, ...], Deque[Dict[str, Any]]] = collections.defaultdict(collections.deque)
+        self._last: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+        if mode == REPLAY:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    key = match_key(entry["source"], entry["method"], entry["url"], entry.get("form", ""))
+                    self._entries[key].append(entry)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def record(self, source: str, method: str, url: str, status: int, headers: Dict[str, str],
+               body: bytes, elapsed: float, request_bytes: int = 0, form: str = "") -> None:
+        """Appends one exchange to the cassette; form is the request's form_fields()."""
+        entry = {
+            "source": source,
+            "at": round(time.monotonic() - self._started, 6),
+            "method": method.upper(),
+            "url": redact_url(url),
+            "form": form,
+            "request_bytes": request_bytes,
+            "status": status,
+            "headers": {k: v for k, v in headers.items() if k.lower() not in _DROPPED_HEADERS},
+            "elapsed": round(elapsed, 6),
+        }
+        try:
+            entry["body"] = body.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["body_b64"] = base64.b64encode(body).decode("ascii")
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = gzip.open(self.path, "at", encoding="utf-8")
+            self._file.write(line)
+        metrics.incr("cassette_records", source=source)
+
+    def replay(self, source: str, method: str, url: str, form: str = "") -> Optional[Dict[str, Any]]:
+        """Returns the next recorded exchange for the request, after its recorded delay.
+
+        Once a request's recordings run out the last one is served again;
+        None means the request was never recorded.
+        """
+        key = match_key(source, method, url, form)
+        with self._lock:
+            queue = self._entries.get(key)
+            if queue:
+                entry = self._last[key] = queue.popleft()
+            else:
+                entry = self._last.get(key)
+        if entry is None:
+            metrics.incr("cassette_misses", source=source)
+            return None
+        if self.speed > 0:
+            time.sleep(entry["elapsed"] / self.speed)
+        metrics.incr("cassette_replays", source=source)
+        return entry
+
+    @staticmethod
+    def body(entry: Dict[str, Any]) -> bytes:
+        if "body_b64" in entry:
+            return base64.b64decode(entry["body_b64"])
+        return entry.get("body", "").encode("utf-8")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def get_cassette() -> Optional[Cassette]:
+    """Returns the process-wide cassette, or None unless CASSETTE_MODE is set."""
+    global _cassette
+    if CASSETTE_MODE not in (RECORD, REPLAY):
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(CASSETTE_FILE, CASSETTE_MODE)
+            atexit.register(_cassette.close)
+    return _cassette
+
+
+class CassetteAdapter(BaseAdapter):
+    """Records what the wrapped adapter returns, or replays it instead."""
+
+    def __init__(self, adapter: BaseAdapter, cassette: Cassette) -> None:
+        super().__init__()
+        self.adapter = adapter
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        form = form_fields(request.body, request.headers.get("Content-Type"))
+        if self.cassette.replaying:
+            entry = self.cassette.replay("http", request.method, request.url, form)
+            if entry is None:
+                raise requests.ConnectionError(f"No recorded response for {request.method} {redact_url(request.url)}")
+            response = requests.Response()
+            response.status_code = entry["status"]
+            response.headers = CaseInsensitiveDict(entry["headers"])
+            response._content = self.cassette.body(entry)
+            # Streaming callers read the body through iter_content and close raw
+            response._content_consumed = True
+            response.raw = io.BytesIO(response._content)
+            response.url = request.url
+            response.request = request
+            response.reason = _reason(entry["status"])
+            response.elapsed = datetime.timedelta(seconds=entry["elapsed"])
+            return response
+
+        started = time.monotonic()
+        response = self.adapter.send(request, **kwargs)
+        body = response.content
+        self.cassette.record(
+            "http", request.method, request.url, response.status_code, dict(response.headers),
+            body, time.monotonic() - started, len(request.body) if isinstance(request.body, (bytes, str)) else 0,
+            form,
+        )
+        return response
+
+    def close(self) -> None:
+        self.adapter.close()
+
+
+def wrap_adapter(adapter: BaseAdapter) -> BaseAdapter:
+    """Wraps a requests adapter for the active cassette, if any."""
+    cassette = get_cassette()
+    return adapter if cassette is None else CassetteAdapter(adapter, cassette)
+
+
+def _reason(status: int) -> str:
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        return ""
+
+
+class _ReplayedResponse:
+    def __init__(self, status: int, data: bytes) -> None:
+        self.status = status
+        self.data = data
+
+
+class _CassettePool:
+    """Stands in for a telegram Request's urllib3 pool."""
+
+    def __init__(self, pool: Any, cassette: Cassette) -> None:
+        self._pool = pool
+        self.cassette = cassette
+
+    def request(self, method: str, url: str, *args: Any, **kwargs: Any):
+        if self.cassette.replaying:
+            entry = self.cassette.replay("telegram", method, url)
+            if entry is None:
+                raise urllib3.exceptions.HTTPError(f"No recorded response for {method} {redact_url(url)}")
+            return _ReplayedResponse(entry["status"], self.cassette.body(entry))
+        started = time.monotonic()
+        response = self._pool.request(method, url, *args, **kwargs)
+        self.cassette.record(
+            "telegram", method, url, response.status, dict(response.headers),
+            response.data, time.monotonic() - started, len(kwargs.get("body") or b""),
+        )
+        return response
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._pool, name)
+
+
+def telegram_request(**kwargs: Any):
+    """Returns a telegram Request bound to the active cassette, or None.
+
+    Only the connection pool is swapped, so python-telegram-bot still maps
+    recorded statuses to its own errors.
+    """
+    cassette = get_cassette()
+    if cassette is None:
+        return None
+
+    from telegram.utils.request import Request
+
+    request = Request(**kwargs)
+    request._con_pool = _CassettePool(request._con_pool, cassette)
+    return request
@@ -0,0 +1,118 @@
+"""Compiled, memory-mappable post catalog with a sorted id index.
+
+Layout (little-endian)::
+
+    header   magic(8) count(u32) reserved(u32)
+    index    count x [id(i64) offset(u64) length(u32) reserved(u32)], sorted by id
+    data     UTF-8 JSON for each post, concatenated
+
+Looking a post up by id is a binary search over the fixed-width index, and
+only the matching record is decoded, so the catalog is never parsed whole.
+"""
+import json
+import mmap
+import random
+import struct
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+MAGIC = b"TPCAT\x00\x01\x00"
+HEADER = struct.Struct("<8sII")
+ENTRY = struct.Struct("<qQII")
+
+
+def assign_unique_ids(posts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Makes post ids unique in a single pass over the catalog.
+
+    The first post keeps a contested id; later duplicates are given fresh ids
+    above the highest id seen, so a reassigned id never collides with one
+    that appears further down the list.
+    """
+    seen = set()
+    duplicates = []
+    highest = 0
+    for post in posts:
+        post_id = post["id"]
+        if post_id in seen:
+            duplicates.append(post)
+        else:
+            seen.add(post_id)
+            highest = max(highest, post_id)
+    for post in duplicates:
+        highest += 1
+        post["id"] = highest
+    return duplicates
+
+
+def compile_catalog(posts: List[Dict[str, Any]]) -> bytes:
+    """Serialises posts (with unique ids) into the catalog layout."""
+    records = sorted(
+        (post["id"], json.dumps(post, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        for post in posts
+    )
+    data_start = HEADER.size + ENTRY.size * len(records)
+    parts = [HEADER.pack(MAGIC, len(records), 0)]
+    offset = data_start
+    for post_id, body in records:
+        parts.append(ENTRY.pack(post_id, offset, len(body), 0))
+        offset += len(body)
+    parts.extend(body for _, body in records)
+    return b"".join(parts)
+
+
+class Catalog:
+    """Read-only view over a compiled catalog, backed by mmap or bytes."""
+
+    def __init__(self, buffer: Union[bytes, mmap.mmap]) -> None:
+        magic, count, _ = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("not a compiled post catalog")
+        self._buffer = buffer
+        self._count = count
+
+    @classmethod
+    def open(cls, path: str) -> "Catalog":
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @classmethod
+    def from_posts(cls, posts: List[Dict[str, Any]]) -> "Catalog":
+        return cls(compile_catalog(posts))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _entry(self, index: int):
+        return ENTRY.unpack_from(self._buffer, HEADER.size + index * ENTRY.size)
+
+    def _decode(self, offset: int, length: int) -> Dict[str, Any]:
+        return json.loads(bytes(self._buffer[offset:offset + length]).decode("utf-8"))
+
+    def ids(self) -> Iterator[int]:
+        """Yields every post id in ascending order, reading only the index."""
+        for index in range(self._count):
+            yield self._entry(index)[0]
+
+    def at(self, index: int) -> Dict[str, Any]:
+        """Returns the post stored at position index."""
+        _, offset, length, _ = self._entry(index)
+        return self._decode(offset, length)
+
+    def get(self, post_id: int) -> Optional[Dict[str, Any]]:
+        """Returns the post with post_id, or None if it is not in the catalog."""
+        low, high = 0, self._count - 1
+        while low <= high:
+            middle = (low + high) // 2
+            entry_id, offset, length, _ = self._entry(middle)
+            if entry_id == post_id:
+                return self._decode(offset, length)
+            if entry_id < post_id:
+                low = middle + 1
+            else:
+                high = middle - 1
+        return None
+
+    def random(self) -> Optional[Dict[str, Any]]:
+        """Returns a uniformly random post."""
+        if not self._count:
+            return None
+        return self.at(random.randrange(self._count))
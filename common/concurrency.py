@@ -0,0 +1,37 @@
+"""Bounded concurrent fan-out for independent I/O-bound calls."""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional
+
+
+class BatchResult(NamedTuple):
+    """Outcome of one item in a batch: either a result or the error it raised."""
+    item: Any
+    result: Any
+    error: Optional[BaseException]
+
+
+def fetch_all(
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_workers: int = 8,
+) -> List[BatchResult]:
+    """Runs func over items with at most max_workers in flight.
+
+    Results come back in the same order as items, and an exception raised for
+    one item is captured in its BatchResult instead of cancelling the others.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    def run(item: Any) -> BatchResult:
+        try:
+            return BatchResult(item, func(item), None)
+        except Exception as e:
+            return BatchResult(item, None, e)
+
+    workers = max(1, min(max_workers, len(items)))
+    if workers == 1:
+        return [run(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run, items))
@@ -0,0 +1,61 @@
+"""Expiry-ordered dedupe index over recently posted ids."""
+import heapq
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+class ExpiryIndex:
+    """Tracks which ids are inside their repost window.
+
+    Timestamps arrive as epoch seconds, so nothing is parsed per query. A
+    min-heap keyed on expiry lets ``prune`` drop lapsed entries in amortised
+    O(log n) each. When built over a ``universe`` of catalog ids it also keeps
+    the set of ids that are free to post, so ``available`` costs O(available).
+    """
+
+    def __init__(self, window: float, entries: Iterable[Tuple[str, float]] = (),
+                 universe: Optional[Iterable] = None) -> None:
+        self.window = window
+        self._expires: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._universe: Optional[Set[str]] = None
+        self._available: Set[str] = set()
+        now = time.time()
+        for post_id, posted_at in entries:
+            expires_at = posted_at + window
+            if expires_at > now:
+                self._expires[str(post_id)] = expires_at
+                self._heap.append((expires_at, str(post_id)))
+        heapq.heapify(self._heap)
+        if universe is not None:
+            self._universe = {str(post_id) for post_id in universe}
+            self._available = self._universe.difference(self._expires)
+
+    def prune(self, now: Optional[float] = None) -> None:
+        """Drops every entry whose window has passed."""
+        now = time.time() if now is None else now
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, post_id = heapq.heappop(self._heap)
+            # Re-marked ids leave stale heap entries behind; skip those.
+            if self._expires.get(post_id) != expires_at:
+                continue
+            del self._expires[post_id]
+            if self._universe is not None and post_id in self._universe:
+                self._available.add(post_id)
+
+    def add(self, post_id, posted_at: Optional[float] = None) -> None:
+        """Marks post_id as posted at posted_at (default now)."""
+        post_id = str(post_id)
+        expires_at = (time.time() if posted_at is None else posted_at) + self.window
+        self._expires[post_id] = expires_at
+        heapq.heappush(self._heap, (expires_at, post_id))
+        self._available.discard(post_id)
+
+    def __contains__(self, post_id) -> bool:
+        self.prune()
+        return str(post_id) in self._expires
+
+    def available(self) -> List[str]:
+        """Returns universe ids that are outside their repost window."""
+        self.prune()
+        return list(self._available)
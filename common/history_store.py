@@ -0,0 +1,113 @@
+"""SQLite-backed post history with in-memory lookups and batched commits."""
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+HISTORY_DB = os.getenv("HISTORY_DB", "post_history.db")
+LEGACY_HISTORY_FILE = "post_history.json"
+
+# Entries older than this are compacted away; it bounds every dedupe window.
+HISTORY_TTL = float(os.getenv("HISTORY_TTL_HOURS", "168")) * 3600
+
+
+class PostHistory:
+    """Per-account record of what was posted and when.
+
+    Lookups are served from a dict loaded once at start-up; ``mark`` only
+    buffers, and ``commit`` writes the whole run in one transaction, then
+    drops entries older than the TTL.
+    """
+
+    def __init__(self, path: str = HISTORY_DB, ttl: float = HISTORY_TTL,
+                 legacy_file: str = LEGACY_HISTORY_FILE) -> None:
+        self.path = path
+        self.ttl = ttl
+        self._pending: List[Tuple[str, str, float]] = []
+        # The daemon runs jobs on scheduler threads, one at a time.
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            "account TEXT NOT NULL, post_id TEXT NOT NULL, posted_at REAL NOT NULL, "
+            "PRIMARY KEY (account, post_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS history_age ON history (posted_at)")
+        self._conn.commit()
+        self._accounts: Dict[str, Dict[str, float]] = {}
+        self._load(legacy_file)
+
+    def _load(self, legacy_file: str) -> None:
+        cutoff = time.time() - self.ttl
+        rows = self._conn.execute(
+            "SELECT account, post_id, posted_at FROM history WHERE posted_at >= ?", (cutoff,)
+        ).fetchall()
+        if not rows and legacy_file and os.path.exists(legacy_file):
+            rows = self._import_legacy(legacy_file, cutoff)
+        for account, post_id, posted_at in rows:
+            self._accounts.setdefault(account, {})[post_id] = posted_at
+
+    def _import_legacy(self, legacy_file: str, cutoff: float) -> List[Tuple[str, str, float]]:
+        """Seeds an empty store from the old post_history.json layout."""
+        try:
+            with open(legacy_file, "r") as f:
+                legacy = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error loading legacy history: {e}")
+            return []
+        rows = []
+        for account, entries in legacy.items():
+            for post_id, posted_at in entries.items():
+                try:
+                    timestamp = datetime.fromisoformat(posted_at).timestamp()
+                except (TypeError, ValueError):
+                    continue
+                if timestamp >= cutoff:
+                    rows.append((account, str(post_id), timestamp))
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO history VALUES (?, ?, ?)", rows)
+        return rows
+
+    def contains(self, account: str, post_id) -> bool:
+        """Returns True if post_id was posted from account within the TTL."""
+        return str(post_id) in self._accounts.get(account, {})
+
+    def posted_at(self, account: str, post_id) -> Optional[float]:
+        """Returns the epoch time post_id was posted from account, if known."""
+        return self._accounts.get(account, {}).get(str(post_id))
+
+    def items(self, account: str) -> Iterator[Tuple[str, float]]:
+        """Yields (post_id, posted_at) pairs for an account."""
+        return iter(self._accounts.get(account, {}).items())
+
+    def mark(self, account: str, post_id, posted_at: Optional[float] = None) -> None:
+        """Records a post in memory; it is persisted by the next commit."""
+        posted_at = time.time() if posted_at is None else posted_at
+        self._accounts.setdefault(account, {})[str(post_id)] = posted_at
+        self._pending.append((account, str(post_id), posted_at))
+
+    def commit(self) -> None:
+        """Writes buffered marks in one transaction and compacts expired rows.
+
+        Expired entries are dropped from memory too, so a long-lived process
+        forgets them when a fresh one would.
+        """
+        cutoff = time.time() - self.ttl
+        with self._conn:
+            if self._pending:
+                self._conn.executemany("INSERT OR REPLACE INTO history VALUES (?, ?, ?)", self._pending)
+            self._conn.execute("DELETE FROM history WHERE posted_at < ?", (cutoff,))
+        self._pending = []
+        for account, entries in list(self._accounts.items()):
+            live = {post_id: posted_at for post_id, posted_at in entries.items() if posted_at >= cutoff}
+            if live:
+                self._accounts[account] = live
+            else:
+                del self._accounts[account]
+
+    def close(self) -> None:
+        self.commit()
+        self._conn.close()
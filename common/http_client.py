@@ -0,0 +1,150 @@
+"""Shared, pooled HTTP session used by every entry point."""
+import os
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from common import cassette, metrics, retry
+from common.cache import make_key
+from common.response_cache import ResponseCache
+
+# (connect, read) timeout applied whenever a caller does not pass one.
+DEFAULT_TIMEOUT: Tuple[float, float] = (
+    float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+    float(os.getenv("HTTP_READ_TIMEOUT", "30")),
+)
+
+# Keep-alive pool size for hosts not listed in HOST_POOL_SIZES.
+DEFAULT_POOL_SIZE = 4
+
+# Per-host connection pool sizes, tuned to how many requests each run makes.
+HOST_POOL_SIZES = {
+    "min-api.cryptocompare.com": 16,
+    "api.coingecko.com": 8,
+    "api.twitter.com": 4,
+    "upload.twitter.com": 4,
+    "raw.githubusercontent.com": 4,
+}
+
+DEFAULT_HEADERS = {
+    "Accept-Encoding": "gzip, deflate",
+    "User-Agent": "Terminals-Pumps/1.0 (+https://github.com/likhonisaac/Terminals-Pumps)",
+}
+
+_session: Optional[requests.Session] = None
+_response_cache = ResponseCache()
+
+
+# Only these are retried; a replayed POST could publish twice.
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter with a default timeout, per-host pacing and retries.
+
+    Every request first takes a token from its host's bucket. Idempotent
+    requests that fail with a connection error or a retryable status are
+    retried with jittered backoff, honouring Retry-After, until the policy or
+    the run deadline is exhausted.
+    """
+
+    def __init__(self, timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+                 policy: retry.RetryPolicy = retry.DEFAULT_POLICY, **kwargs: Any) -> None:
+        self.timeout = timeout
+        self.policy = policy
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        host = urlsplit(request.url).hostname
+        bucket = retry.bucket_for(host)
+        attempts = self.policy.max_attempts if request.method in IDEMPOTENT_METHODS else 1
+
+        for attempt in range(attempts):
+            if bucket is not None and not bucket.acquire():
+                raise requests.Timeout(f"Run deadline reached waiting for {host} rate limit")
+            metrics.incr("http_requests", host=host, method=request.method)
+            last_attempt = attempt == attempts - 1
+            try:
+                response = super().send(request, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt or not retry.sleep(self.policy.delay(attempt)):
+                    raise
+                metrics.incr("retries", host=host)
+                continue
+
+            retry.note_quota(host, response.headers)
+            if response.status_code not in retry.RETRY_STATUSES or last_attempt:
+                return response
+            delay = self.policy.delay(attempt, retry.parse_retry_after(response.headers.get("Retry-After")))
+            if not retry.sleep(delay):
+                return response
+            metrics.incr("retries", host=host)
+            # Drain the error body so the connection goes back to the pool.
+            response.content
+            response.close()
+        return response
+
+
+def configure_session(session: requests.Session) -> requests.Session:
+    """Mounts pooled, timeout-aware adapters and default headers on a session.
+
+    Under CASSETTE_MODE the adapters record to, or replay from, the cassette.
+    """
+    for scheme in ("https://", "http://"):
+        session.mount(scheme, cassette.wrap_adapter(TimeoutHTTPAdapter(pool_maxsize=DEFAULT_POOL_SIZE)))
+    # Longer prefixes win, so each known host gets its own sized pool.
+    for host, size in HOST_POOL_SIZES.items():
+        session.mount(
+            f"https://{host}/",
+            cassette.wrap_adapter(TimeoutHTTPAdapter(pool_connections=1, pool_maxsize=size)),
+        )
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Returns the process-wide session, creating it on first use."""
+    global _session
+    if _session is None:
+        _session = configure_session(requests.Session())
+    return _session
+
+
+def get(url: str, **kwargs: Any) -> requests.Response:
+    """GET through the shared session."""
+    return get_session().get(url, **kwargs)
+
+
+def get_json(url: str, params: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Any:
+    """GETs a JSON document, revalidating against the on-disk response cache.
+
+    Stored ETag/Last-Modified validators are sent as conditional headers; a
+    304 returns the cached parsed body as-is. Raises requests exceptions like
+    ``Response.raise_for_status`` does.
+    """
+    key = make_key(url, params)
+    cached = _response_cache.get(key)
+    headers = dict(kwargs.pop("headers", None) or {})
+    if cached is not None:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+    response = get(url, params=params, headers=headers, **kwargs)
+    if response.status_code == 304 and cached is not None:
+        metrics.incr("cache_hits", cache="response")
+        return cached.value
+    metrics.incr("cache_misses", cache="response")
+    response.raise_for_status()
+    data = response.json()
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if etag or last_modified:
+        _response_cache.put(key, etag, last_modified, data)
+    return data
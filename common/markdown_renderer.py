@@ -0,0 +1,90 @@
+"""Section-by-section markdown rendering with a content-hash cache."""
+import functools
+import hashlib
+import io
+import json
+import os
+from typing import Any, Callable, Dict, Optional
+
+from common import metrics
+from common.artifacts import atomic_write
+from common.cache import CACHE_DIR
+
+SECTION_CACHE_PATH = os.path.join(CACHE_DIR, "markdown_sections.json")
+
+
+def content_hash(data: Any) -> str:
+    """Hashes any JSON-like value independent of dict ordering."""
+    encoded = json.dumps(data, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _source_hash(filename: str) -> str:
+    try:
+        with open(filename, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return ""
+
+
+def renderer_version(render: Callable[..., Any]) -> str:
+    """Identifies the code behind render: the source of the module defining it.
+
+    Cached sections survive between runs, so editing a renderer or the
+    helpers next to it must invalidate them even when the data is unchanged.
+    """
+    code = render.__code__
+    return _source_hash(code.co_filename) or hashlib.sha1(code.co_code).hexdigest()
+
+
+class SectionRenderer:
+    """Streams sections into one buffer, re-rendering only changed ones.
+
+    Each section's output is cached under its name together with a hash of
+    the data it was rendered from and the renderer's code; unchanged data
+    rendered by unchanged code reuses the cached text.
+    """
+
+    def __init__(self, cache_path: Optional[str] = SECTION_CACHE_PATH) -> None:
+        self.cache_path = cache_path
+        self.buffer = io.StringIO()
+        self._cache: Dict[str, Dict[str, str]] = {}
+        self._dirty = False
+        if cache_path:
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    self._cache = json.load(f)
+            except (OSError, ValueError):
+                self._cache = {}
+
+    def write(self, text: str) -> None:
+        """Writes uncached text (headers, timestamps) straight to the buffer."""
+        self.buffer.write(text)
+
+    def section(self, name: str, data: Any, render: Callable[[io.StringIO, Any], None]) -> None:
+        """Appends a section, calling render(out, data) only if data or render changed."""
+        digest = content_hash([renderer_version(render), data])
+        cached = self._cache.get(name)
+        if cached and cached["hash"] == digest:
+            metrics.incr("cache_hits", cache="markdown_section")
+            self.buffer.write(cached["text"])
+            return
+        metrics.incr("cache_misses", cache="markdown_section")
+        out = io.StringIO()
+        render(out, data)
+        text = out.getvalue()
+        self._cache[name] = {"hash": digest, "text": text}
+        self._dirty = True
+        self.buffer.write(text)
+
+    def getvalue(self) -> str:
+        """Returns the full document and persists any newly rendered sections."""
+        if self._dirty and self.cache_path:
+            try:
+                atomic_write(self.cache_path, json.dumps(self._cache, ensure_ascii=False), durable=False)
+                self._dirty = False
+            except OSError:
+                pass
+        return self.buffer.getvalue()
+
@@ -0,0 +1,124 @@
+"""Single CoinGecko gateway shared by the Telegram and markdown entry points.
+
+Both consumers need overlapping BTC/ETH figures, so prices are served from one
+``/coins/markets`` request whose rows carry everything ``/simple/price`` used
+to provide. Responses are cached by endpoint and parameters for
+MARKET_DATA_TTL seconds in memory and on disk.
+
+The cache is only shared between entry points that run in one process
+(``daemon.py``) or on one machine within the TTL. The cron workflows each
+restore their own ``.cache`` and run 30-60 minutes apart, so there every
+run fetches fresh data; a TTL long enough to bridge them would leave the
+Telegram dashboard showing prices up to an hour old.
+"""
+import math
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from common import http_client, metrics
+from common.cache import TTLCache, make_key
+from common.concurrency import fetch_all
+
+COINGECKO_API = os.getenv("COINGECKO_API", "https://api.coingecko.com/api/v3")
+MARKET_DATA_TTL = int(os.getenv("MARKET_DATA_TTL", "300"))
+
+# Number of coins tracked by market cap; CoinGecko serves at most 250 per page.
+MARKET_TOP_N = int(os.getenv("MARKET_TOP_N", "4"))
+MAX_PER_PAGE = 250
+
+# Significant digits shown for prices below one dollar.
+PRICE_SIGNIFICANT_DIGITS = 4
+
+# Top-of-market page requested for every consumer; covers bitcoin and ethereum.
+MARKETS_PARAMS = {
+    "vs_currency": "usd",
+    "order": "market_cap_desc",
+    "per_page": min(MARKET_TOP_N, MAX_PER_PAGE),
+    "page": 1,
+    "sparkline": "false",
+    "price_change_percentage": "24h,7d",
+}
+
+_cache = TTLCache("market_data", MARKET_DATA_TTL)
+
+
+def _get_json(endpoint: str, params: Dict[str, Any]) -> Any:
+    """Fetches a CoinGecko endpoint, serving from the TTL cache when fresh."""
+    key = make_key(endpoint, params)
+    cached = _cache.get(key)
+    if cached is not None:
+        metrics.incr("cache_hits", cache="market_data")
+        return cached
+    metrics.incr("cache_misses", cache="market_data")
+    data = http_client.get_json(
+        f"{COINGECKO_API}/{endpoint}",
+        params=params,
+        headers={"Accept": "application/json"},
+    )
+    _cache.set(key, data)
+    return data
+
+
+def get_markets(**overrides: Any) -> List[Dict[str, Any]]:
+    """Returns ``/coins/markets`` rows for the shared top-of-market page."""
+    return _get_json("coins/markets", {**MARKETS_PARAMS, **overrides})
+
+
+def get_top_markets(count: int = MARKET_TOP_N) -> List[Dict[str, Any]]:
+    """Returns the top count coins by market cap, fetching pages concurrently.
+
+    Raises the first page error, since a table with a gap in it is worse than
+    no update.
+    """
+    per_page = max(1, min(count, MAX_PER_PAGE))
+    pages = range(1, -(-count // per_page) + 1)
+    rows: List[Dict[str, Any]] = []
+    for outcome in fetch_all(lambda page: get_markets(per_page=per_page, page=page), pages, len(pages)):
+        if outcome.error:
+            raise outcome.error
+        rows.extend(outcome.result)
+    return rows[:count]
+
+
+def _simple_price_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "usd": row.get("current_price"),
+        "usd_market_cap": row.get("market_cap"),
+        "usd_24h_vol": row.get("total_volume"),
+        "usd_24h_change": row.get("price_change_percentage_24h"),
+    }
+
+
+def get_simple_prices(ids: Iterable[str], fetch_missing: bool = True) -> Dict[str, Dict[str, Any]]:
+    """Returns prices keyed by coin id in the ``/simple/price`` shape.
+
+    Coins already on the shared markets page cost no extra request; any
+    others are resolved together in a single ``ids=`` markets call, or left
+    out when fetch_missing is false.
+    """
+    ids = list(ids)
+    rows = {row["id"]: row for row in get_markets()}
+    missing = [coin_id for coin_id in ids if coin_id not in rows]
+    if missing and fetch_missing:
+        extra = get_markets(ids=",".join(sorted(missing)), per_page=len(missing))
+        rows.update({row["id"]: row for row in extra})
+    return {coin_id: _simple_price_row(rows[coin_id]) for coin_id in ids if coin_id in rows}
+
+
+def get_trending() -> Optional[Dict[str, Any]]:
+    """Returns the ``/search/trending`` payload."""
+    return _get_json("search/trending", {})
+
+
+def format_price(value: float) -> str:
+    """Formats a USD price without the currency sign.
+
+    Prices of a dollar or more get two decimals. Smaller ones keep
+    PRICE_SIGNIFICANT_DIGITS significant digits with trailing zeros
+    dropped, but never fewer than two decimals.
+    """
+    if not value or abs(value) >= 1:
+        return f"{value:,.2f}"
+    decimals = max(2, PRICE_SIGNIFICANT_DIGITS - 1 - math.floor(math.log10(abs(value))))
+    whole, fraction = f"{value:.{decimals}f}".split(".")
+    return f"{whole}.{fraction.rstrip('0').ljust(2, '0')}"
@@ -0,0 +1,160 @@
+"""Streaming, chunked media upload to Twitter with bounded memory.
+
+Downloads are read in MEDIA_CHUNK_SIZE pieces by a background thread and
+handed to the uploader through a small queue, so the next chunk downloads
+while the previous one is being APPENDed and at most a few chunks are held in
+memory at any time.
+"""
+import contextlib
+import mimetypes
+import os
+import queue
+import tempfile
+import threading
+from typing import IO, Iterable, Iterator, Optional
+
+from common import http_client, retry
+
+MEDIA_UPLOAD_URL = os.getenv("TWITTER_UPLOAD_URL", "https://upload.twitter.com/1.1/media/upload.json")
+MEDIA_CHUNK_SIZE = int(os.getenv("MEDIA_CHUNK_SIZE", str(1024 * 1024)))
+
+# Chunks buffered between the download and upload threads.
+PREFETCH_CHUNKS = 2
+
+# STATUS checks allowed while Twitter processes an upload.
+MEDIA_STATUS_MAX_POLLS = int(os.getenv("MEDIA_STATUS_MAX_POLLS", "10"))
+
+_DONE = object()
+
+
+def rechunk(pieces: Iterable[bytes], size: int = MEDIA_CHUNK_SIZE) -> Iterator[bytes]:
+    """Regroups arbitrary byte pieces into chunks of exactly size (last may be short)."""
+    buffer = bytearray()
+    for piece in pieces:
+        buffer += piece
+        while len(buffer) >= size:
+            yield bytes(buffer[:size])
+            del buffer[:size]
+    if buffer:
+        yield bytes(buffer)
+
+
+def prefetch(chunks: Iterable[bytes], depth: int = PREFETCH_CHUNKS) -> Iterator[bytes]:
+    """Pulls chunks on a background thread, at most depth ahead of the consumer.
+
+    Closing the iterator early, as a failed APPEND does, stops the thread and
+    drops the buffered chunks instead of leaving it blocked on a full queue.
+    """
+    pending: "queue.Queue" = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def produce() -> None:
+        # Every put is preceded by a stop check, so once the consumer has
+        # stopped and drained the queue at most one more put happens and it
+        # never blocks.
+        source = iter(chunks)
+        try:
+            for chunk in source:
+                if stop.is_set():
+                    return
+                pending.put(chunk)
+        except Exception as e:
+            if not stop.is_set():
+                pending.put(e)
+            return
+        finally:
+            close = getattr(source, "close", None)
+            if close is not None:
+                close()
+        if not stop.is_set():
+            pending.put(_DONE)
+
+    threading.Thread(target=produce, name="media-prefetch", daemon=True).start()
+    try:
+        while True:
+            item = pending.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        while True:
+            try:
+                pending.get_nowait()
+            except queue.Empty:
+                break
+
+
+def read_file_chunks(file: IO[bytes], size: int = MEDIA_CHUNK_SIZE) -> Iterator[bytes]:
+    while True:
+        chunk = file.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _command(auth, data, files=None):
+    response = auth.post(MEDIA_UPLOAD_URL, data=data, files=files)
+    response.raise_for_status()
+    return response.json() if response.content else {}
+
+
+def upload_chunks(auth, chunks: Iterable[bytes], total_bytes: int, media_type: str) -> str:
+    """Runs INIT/APPEND/FINALIZE for a stream of chunks and returns the media id."""
+    init = _command(auth, {
+        "command": "INIT",
+        "total_bytes": total_bytes,
+        "media_type": media_type,
+    })
+    media_id = init["media_id_string"]
+    for segment_index, chunk in enumerate(chunks):
+        _command(
+            auth,
+            {"command": "APPEND", "media_id": media_id, "segment_index": segment_index},
+            files={"media": chunk},
+        )
+    info = _command(auth, {"command": "FINALIZE", "media_id": media_id}).get("processing_info")
+    polls = 0
+    while info and info.get("state") in ("pending", "in_progress"):
+        if polls >= MEDIA_STATUS_MAX_POLLS:
+            raise RuntimeError(f"Media {media_id} still {info.get('state')} after {polls} status checks")
+        if not retry.sleep(info.get("check_after_secs", 1)):
+            raise RuntimeError(f"Run deadline reached while media {media_id} was processing")
+        polls += 1
+        status = auth.get(MEDIA_UPLOAD_URL, params={"command": "STATUS", "media_id": media_id})
+        status.raise_for_status()
+        info = status.json().get("processing_info")
+    if info and info.get("state") == "failed":
+        raise RuntimeError(f"Media processing failed: {info.get('error')}")
+    return media_id
+
+
+def upload_file(auth, path: str, media_type: Optional[str] = None) -> str:
+    """Uploads a local file in chunks."""
+    media_type = media_type or mimetypes.guess_type(path)[0] or "image/jpeg"
+    with open(path, "rb") as file, contextlib.closing(prefetch(read_file_chunks(file))) as chunks:
+        return upload_chunks(auth, chunks, os.path.getsize(path), media_type)
+
+
+def upload_from_url(auth, url: str) -> str:
+    """Streams a remote file straight into a chunked upload."""
+    with http_client.get(url, stream=True) as response:
+        response.raise_for_status()
+        media_type = response.headers.get("Content-Type", "").split(";")[0] or "image/jpeg"
+        pieces = response.iter_content(chunk_size=64 * 1024)
+        length = response.headers.get("Content-Length")
+        if length and "Content-Encoding" not in response.headers:
+            with contextlib.closing(prefetch(rechunk(pieces))) as chunks:
+                return upload_chunks(auth, chunks, int(length), media_type)
+
+        # INIT needs the size up front; spool unknown-length bodies, in memory
+        # only up to one chunk.
+        with tempfile.SpooledTemporaryFile(max_size=MEDIA_CHUNK_SIZE) as spool:
+            for piece in pieces:
+                spool.write(piece)
+            total_bytes = spool.tell()
+            spool.seek(0)
+            with contextlib.closing(prefetch(read_file_chunks(spool))) as chunks:
+                return upload_chunks(auth, chunks, total_bytes, media_type)
@@ -0,0 +1,100 @@
+"""Content-addressed cache of upload-ready images.
+
+Local images are resized and recompressed once to fit Twitter's in-stream
+display, and the optimised bytes are stored under the SHA-256 of the source
+file. Later runs reuse them straight from disk. Pillow is optional; without it
+the original file is uploaded unchanged.
+"""
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, Optional, Tuple
+
+from common import metrics
+from common.artifacts import atomic_write
+from common.cache import CACHE_DIR
+
+MEDIA_CACHE_DIR = os.path.join(CACHE_DIR, "media")
+
+# Bounding box and JPEG quality for optimised uploads.
+MAX_DIMENSIONS: Tuple[int, int] = (1200, 1200)
+JPEG_QUALITY = 85
+
+_INDEX_FILE = "index.json"
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class MediaCache:
+    """Maps source images to optimised copies keyed by content hash."""
+
+    def __init__(self, cache_dir: str = MEDIA_CACHE_DIR) -> None:
+        self.cache_dir = cache_dir
+        self._index_path = os.path.join(cache_dir, _INDEX_FILE)
+        self._index: Optional[Dict[str, Dict[str, object]]] = None
+
+    def _load_index(self) -> Dict[str, Dict[str, object]]:
+        if self._index is None:
+            try:
+                with open(self._index_path, "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self) -> None:
+        try:
+            atomic_write(self._index_path, json.dumps(self._index), durable=False)
+        except OSError:
+            pass
+
+    def _digest(self, path: str) -> str:
+        """Hashes path, skipping the read when size and mtime are unchanged."""
+        stat = os.stat(path)
+        index = self._load_index()
+        entry = index.get(os.path.abspath(path))
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return entry["sha256"]
+        digest = file_digest(path)
+        index[os.path.abspath(path)] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": digest}
+        self._save_index()
+        return digest
+
+    def optimized(self, path: str) -> str:
+        """Returns the path of an upload-ready copy of the image at path."""
+        try:
+            # Imported lazily: Pillow is optional and slow to import.
+            from PIL import Image
+        except ImportError:
+            return path
+        os.makedirs(self.cache_dir, exist_ok=True)
+        width, height = MAX_DIMENSIONS
+        target = os.path.join(self.cache_dir, f"{self._digest(path)}-{width}x{height}-q{JPEG_QUALITY}.jpg")
+        if os.path.exists(target):
+            metrics.incr("cache_hits", cache="media")
+            return target
+        metrics.incr("cache_misses", cache="media")
+
+        tmp_path = f"{target}.tmp"
+        try:
+            with Image.open(path) as image:
+                image = image.convert("RGB")
+                image.thumbnail(MAX_DIMENSIONS)
+                image.save(tmp_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            # Never upload something bigger than the original.
+            if os.path.getsize(tmp_path) >= os.path.getsize(path):
+                shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, target)
+        except Exception as e:
+            print(f"Error optimising image {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return path
+        return target
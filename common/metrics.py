@@ -0,0 +1,178 @@
+"""Lightweight timing spans and counters with an end-of-run snapshot.
+
+Metrics are off unless METRICS_FILE is set (or ``enable()`` is called). While
+off, ``span`` hands back a shared no-op context manager and ``incr`` returns
+straight away, so instrumented code pays almost nothing. ``write_snapshot``
+writes JSON when the file name ends in ``.json`` and Prometheus text format
+otherwise. Setting PROFILE_DIR also profiles every span; see
+``common.profiling``.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+METRICS_FILE = os.getenv("METRICS_FILE")
+
+_enabled = bool(METRICS_FILE)
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_spans: Dict[str, List[float]] = {}
+# Notified around every span and before each snapshot (see common.profiling)
+_observer: Optional[Any] = None
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_observer(observer: Optional[Any]) -> None:
+    """Registers an object with span_enter(name), span_exit(name) and finish()."""
+    global _observer
+    _observer = observer
+
+
+def reset() -> None:
+    """Clears all recorded metrics."""
+    with _lock:
+        _counters.clear()
+        _spans.clear()
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self):
+        if _observer is not None:
+            _observer.span_enter(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed_ms = (time.perf_counter() - self.start) * 1000
+        with _lock:
+            _spans.setdefault(self.name, []).append(elapsed_ms)
+        if _observer is not None:
+            _observer.span_exit(self.name)
+        return False
+
+
+def span(name: str):
+    """Times the enclosed block under name."""
+    return _Span(name) if _enabled else _NOOP
+
+
+def timed(name: str) -> Callable:
+    """Decorator form of ``span``."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def incr(name: str, value: float = 1, **labels: Any) -> None:
+    """Adds value to the counter identified by name and labels."""
+    if not _enabled:
+        return
+    key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of samples."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def snapshot() -> Dict[str, Any]:
+    """Returns counters and per-span latency summaries recorded so far."""
+    with _lock:
+        counters = [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(_counters.items())
+        ]
+        spans = {
+            name: {
+                "count": len(samples),
+                "sum_ms": sum(samples),
+                "max_ms": max(samples),
+                "p50_ms": percentile(samples, 50),
+                "p90_ms": percentile(samples, 90),
+                "p99_ms": percentile(samples, 99),
+            }
+            for name, samples in sorted(_spans.items())
+        }
+    return {"timestamp": time.time(), "counters": counters, "spans": spans}
+
+
+def _prometheus(data: Dict[str, Any]) -> str:
+    lines = []
+    for counter in data["counters"]:
+        labels = ",".join(f'{k}="{v}"' for k, v in counter["labels"].items())
+        lines.append(f"tp_{counter['name']}_total{{{labels}}} {counter['value']}")
+    for name, stats in data["spans"].items():
+        for quantile in ("50", "90", "99"):
+            lines.append(
+                f'tp_span_seconds{{span="{name}",quantile="0.{quantile}"}} {stats[f"p{quantile}_ms"] / 1000:.6f}'
+            )
+        lines.append(f'tp_span_seconds_sum{{span="{name}"}} {stats["sum_ms"] / 1000:.6f}')
+        lines.append(f'tp_span_seconds_count{{span="{name}"}} {stats["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_snapshot(path: Optional[str] = None) -> Optional[str]:
+    """Writes the snapshot to path (default METRICS_FILE); no-op when disabled.
+
+    The observer's finish() runs afterwards and may raise to fail the run.
+    """
+    path = path or METRICS_FILE
+    try:
+        if not _enabled or not path:
+            return None
+        # Imported here: common.artifacts times its writes through this module.
+        from common.artifacts import atomic_write
+
+        data = snapshot()
+        content = json.dumps(data, indent=2) if path.endswith(".json") else _prometheus(data)
+        # Scrapers such as the textfile collector must never see a partial file
+        atomic_write(path, content, durable=False)
+        return path
+    finally:
+        if _observer is not None:
+            _observer.finish()
+
+
+if os.getenv("PROFILE_DIR"):
+    # Imported last: profiling registers itself through this module.
+    from common import profiling
+    profiling.start()
@@ -0,0 +1,170 @@
+"""SimHash index that spots the same headline syndicated under another id."""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from common.artifacts import atomic_write
+from common.cache import CACHE_DIR
+
+# Fingerprints within this many differing bits count as the same story.
+NEAR_DUPLICATE_DISTANCE = int(os.getenv("NEAR_DUPLICATE_DISTANCE", "6"))
+NEAR_DUPLICATE_WINDOW = float(os.getenv("NEAR_DUPLICATE_HOURS", "72")) * 3600
+NEAR_DUPLICATE_MAX_ENTRIES = int(os.getenv("NEAR_DUPLICATE_MAX_ENTRIES", "5000"))
+
+BITS = 64
+_TOKEN = re.compile(r"[a-z0-9$]+")
+# Words that syndicators add, drop or reorder without changing the story.
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or the to was were will with".split()
+)
+
+
+def normalize(title: str) -> List[str]:
+    """Lowercases, strips accents and punctuation, and drops stopwords."""
+    text = unicodedata.normalize("NFKD", title).encode("ascii", "ignore").decode("ascii").lower()
+    return [token for token in _TOKEN.findall(text) if token not in _STOPWORDS]
+
+
+def _feature_hash(feature: str) -> int:
+    # Python's hash() is salted per process; fingerprints must survive restarts.
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(title: str) -> Optional[int]:
+    """Returns the 64-bit SimHash of a title's words and word pairs.
+
+    Titles with no usable words, including ones written entirely outside
+    ASCII, have no fingerprint and return None; they would otherwise all
+    hash to 0 and match each other.
+    """
+    tokens = normalize(title)
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not features:
+        return None
+    weights = [0] * BITS
+    for feature in features:
+        value = _feature_hash(feature)
+        for bit in range(BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(BITS) if weights[bit] > 0)
+
+
+def is_near(a: int, b: int, distance: int = NEAR_DUPLICATE_DISTANCE) -> bool:
+    """Returns whether two fingerprints differ in at most distance bits."""
+    return bin(a ^ b).count("1") <= distance
+
+
+class SimHashIndex:
+    """Remembers title fingerprints for window seconds, at most max_entries.
+
+    Fingerprints are split into ``distance + 1`` bands; two fingerprints
+    within ``distance`` bits must agree exactly on at least one band, so a
+    lookup only compares against the few entries sharing a band value. The
+    index lives in ``<CACHE_DIR>/<name>.json`` as (fingerprint, added_at)
+    pairs, oldest first. A lock guards it, since pipeline workers look titles
+    up while the committing thread adds them.
+    """
+
+    def __init__(self, name: str, window: float = NEAR_DUPLICATE_WINDOW,
+                 distance: int = NEAR_DUPLICATE_DISTANCE,
+                 max_entries: int = NEAR_DUPLICATE_MAX_ENTRIES,
+                 cache_dir: str = CACHE_DIR) -> None:
+        self.path = os.path.join(cache_dir, f"{name}.json")
+        self.window = window
+        self.distance = distance
+        self.max_entries = max_entries
+        self._bands = distance + 1
+        self._band_bits = -(-BITS // self._bands)
+        self._entries: "OrderedDict[int, float]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, int], Set[int]] = {}
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._load()
+
+    def _band_keys(self, fingerprint: int) -> Iterable[Tuple[int, int]]:
+        mask = (1 << self._band_bits) - 1
+        for band in range(self._bands):
+            yield band, fingerprint >> (band * self._band_bits) & mask
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        for fingerprint, added_at in entries:
+            self._insert(int(fingerprint), float(added_at))
+        self.prune()
+
+    def _insert(self, fingerprint: int, added_at: float) -> None:
+        if fingerprint in self._entries:
+            del self._entries[fingerprint]
+        else:
+            for key in self._band_keys(fingerprint):
+                self._buckets.setdefault(key, set()).add(fingerprint)
+        self._entries[fingerprint] = added_at
+
+    def _evict_oldest(self) -> None:
+        fingerprint, _ = self._entries.popitem(last=False)
+        for key in self._band_keys(fingerprint):
+            bucket = self._buckets[key]
+            bucket.discard(fingerprint)
+            if not bucket:
+                del self._buckets[key]
+        self._dirty = True
+
+    def prune(self, now: Optional[float] = None) -> None:
+        """Drops entries older than the window and trims to max_entries."""
+        cutoff = (time.time() if now is None else now) - self.window
+        with self._lock:
+            while self._entries and next(iter(self._entries.values())) <= cutoff:
+                self._evict_oldest()
+            while len(self._entries) > self.max_entries:
+                self._evict_oldest()
+
+    def find(self, title: str) -> Optional[int]:
+        """Returns the stored fingerprint title nearly duplicates, if any."""
+        fingerprint = simhash(title)
+        if fingerprint is None:
+            return None
+        with self._lock:
+            self.prune()
+            for key in self._band_keys(fingerprint):
+                for candidate in self._buckets.get(key, ()):
+                    if is_near(candidate, fingerprint, self.distance):
+                        return candidate
+        return None
+
+    def __contains__(self, title: str) -> bool:
+        return self.find(title) is not None
+
+    def add(self, title: str, added_at: Optional[float] = None) -> None:
+        """Records title as seen at added_at (default now); titles without a fingerprint are ignored."""
+        fingerprint = simhash(title)
+        if fingerprint is None:
+            return
+        with self._lock:
+            self._insert(fingerprint, time.time() if added_at is None else added_at)
+            self._dirty = True
+            self.prune()
+
+    def save(self) -> None:
+        """Writes the index atomically if it changed since loading."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(list(self._entries.items()), separators=(",", ":"))
+            self._dirty = False
+        try:
+            atomic_write(self.path, data, durable=False)
+        except OSError:
+            # Losing the index only means a syndicated copy may slip through;
+            # the next save tries again.
+            with self._lock:
+                self._dirty = True
@@ -0,0 +1,154 @@
+"""Staged fetch -> transform -> publish pipelines over bounded queues."""
+import os
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, List, NamedTuple, Optional
+
+from common import metrics
+from common.concurrency import BatchResult
+
+# Items allowed to wait between two stages before the upstream stage blocks.
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+_DONE = object()
+
+
+class Stage(NamedTuple):
+    """One step of a pipeline: func runs on up to workers items at once.
+
+    Returning None drops the item; later stages skip it. An ordered stage
+    runs single-threaded and sees items in input order even when an earlier
+    concurrent stage finished them out of order.
+    """
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+    ordered: bool = False
+
+
+class _Packet(NamedTuple):
+    seq: int
+    item: Any
+    value: Any
+    error: Optional[BaseException]
+
+
+class Pipeline:
+    """Runs items through stages connected by bounded queues.
+
+    Each stage has its own worker threads, so a slow stage (media uploads,
+    say) overlaps with the fetches feeding it without running unbounded
+    ahead: a full queue blocks the stage that fills it. Items may finish out
+    of order, but ``commit`` sees them in input order, which keeps history
+    writes deterministic.
+    """
+
+    def __init__(self, *stages: Stage, queue_size: int = PIPELINE_QUEUE_SIZE) -> None:
+        if not stages:
+            raise ValueError("a pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = queue_size
+
+    def _feed(self, items: Iterable[Any], out: "queue.Queue", workers: int, errors: List[BaseException]) -> None:
+        try:
+            for seq, item in enumerate(items):
+                out.put(_Packet(seq, item, item, None))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            for _ in range(workers):
+                out.put(_DONE)
+
+    def _inputs(self, stage: Stage, inbox: "queue.Queue") -> Iterator[_Packet]:
+        if not stage.ordered:
+            yield from iter(inbox.get, _DONE)
+            return
+        # Every item reaches every stage, dropped or not, so no sequence
+        # number is ever missing from the reorder buffer.
+        waiting = {}
+        next_seq = 0
+        for packet in iter(inbox.get, _DONE):
+            waiting[packet.seq] = packet
+            while next_seq in waiting:
+                yield waiting.pop(next_seq)
+                next_seq += 1
+
+    def _work(self, stage: Stage, inbox: "queue.Queue", out: "queue.Queue",
+              next_workers: int, remaining: List[int], lock: threading.Lock) -> None:
+        inputs = self._inputs(stage, inbox)
+        aborted: Optional[BaseException] = None
+        try:
+            for packet in inputs:
+                if packet.error is None and packet.value is not None:
+                    try:
+                        with metrics.span(f"{stage.name}_stage"):
+                            packet = packet._replace(value=stage.func(packet.value))
+                    except Exception as e:
+                        packet = packet._replace(value=None, error=e)
+                    except BaseException as e:
+                        # SystemExit or KeyboardInterrupt ends this worker
+                        aborted = e
+                        out.put(packet._replace(value=None, error=e))
+                        raise
+                out.put(packet)
+        finally:
+            # Pass anything left through as failed, so neither the stages
+            # upstream nor run() wait forever on this worker.
+            for packet in inputs:
+                out.put(packet if packet.error else packet._replace(value=None, error=aborted))
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            # The last worker out tells every worker downstream to finish.
+            if last:
+                for _ in range(next_workers):
+                    out.put(_DONE)
+
+    def run(self, items: Iterable[Any], commit: Optional[Callable[[Any], Any]] = None) -> List[BatchResult]:
+        """Pushes items through every stage and returns results in input order.
+
+        commit is called with each surviving final value, in input order, as
+        soon as every earlier item has finished. Errors raised by a stage or
+        by commit are captured in that item's BatchResult.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        workers = [1 if stage.ordered else max(1, stage.workers) for stage in self.stages] + [1]
+        feed_errors: List[BaseException] = []
+        threads = [threading.Thread(
+            target=self._feed, args=(items, queues[0], workers[0], feed_errors), daemon=True
+        )]
+        for index, stage in enumerate(self.stages):
+            remaining, lock = [workers[index]], threading.Lock()
+            threads.extend(
+                threading.Thread(
+                    target=self._work,
+                    args=(stage, queues[index], queues[index + 1], workers[index + 1], remaining, lock),
+                    name=f"{stage.name}-{n}",
+                    daemon=True,
+                )
+                for n in range(workers[index])
+            )
+        for thread in threads:
+            thread.start()
+
+        results: List[BatchResult] = []
+        pending = {}
+        while True:
+            packet = queues[-1].get()
+            if packet is _DONE:
+                break
+            pending[packet.seq] = packet
+            while len(results) in pending:
+                packet = pending.pop(len(results))
+                error = packet.error
+                if error is None and packet.value is not None and commit is not None:
+                    try:
+                        commit(packet.value)
+                    except Exception as e:
+                        error = e
+                results.append(BatchResult(packet.item, packet.value, error))
+        for thread in threads:
+            thread.join()
+        if feed_errors:
+            raise feed_errors[0]
+        return results
@@ -0,0 +1,262 @@
+"""Opt-in memory and CPU profiling attributed to metrics spans.
+
+Setting PROFILE_DIR turns profiling on for the process. Every
+``metrics.span``/``metrics.timed`` block then becomes a stage. For each
+stage the profiler records the CPU time of the thread that ran it and,
+through tracemalloc, how far traced memory rose above its starting level.
+When an entry point writes its metrics snapshot, the profiler writes three
+files to PROFILE_DIR:
+
+- ``<run>.folded``: wall-clock stack samples of every thread, prefixed with
+  the stages active on that thread. It can be fed to flamegraph.pl or
+  speedscope.
+- ``<run>.pstats``: cProfile output for the thread that started profiling.
+- ``<run>.txt``: per-stage table, peak RSS and the top allocating lines.
+
+PROFILE_MEMORY_BUDGETS ("create_markdown=64,media_stage=32", in MiB, with
+``*`` as a default) fails the run with MemoryBudgetExceeded once the reports
+are written. tracemalloc's peak counter is process-wide: every open stage,
+on any thread, is charged the highest traced memory seen while it ran, so a
+stage running alongside other threads is charged for their allocations too
+and budgets are upper bounds.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from common import metrics
+
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_TRACE_FRAMES = int(os.getenv("PROFILE_TRACE_FRAMES", "5"))
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "25"))
+
+MIB = 1024 * 1024
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """Raised at the end of a profiled run when a stage outgrew its budget."""
+
+
+def parse_budgets(spec: str) -> Dict[str, float]:
+    """Parses "stage=MiB,..." into byte budgets keyed by stage name."""
+    budgets = {}
+    for part in spec.split(","):
+        name, sep, value = part.partition("=")
+        if sep and name.strip():
+            budgets[name.strip()] = float(value) * MIB
+    return budgets
+
+
+PROFILE_MEMORY_BUDGETS = parse_budgets(os.getenv("PROFILE_MEMORY_BUDGETS", ""))
+
+
+class _Frame:
+    __slots__ = ("name", "start_bytes", "start_cpu", "peak")
+
+    def __init__(self, name: str, start_bytes: int) -> None:
+        self.name = name
+        self.start_bytes = start_bytes
+        self.start_cpu = time.thread_time()
+        self.peak = start_bytes
+
+
+class _StageStats:
+    __slots__ = ("calls", "cpu", "peak_growth", "net")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.cpu = 0.0
+        self.peak_growth = 0
+        self.net = 0
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profiler:
+    """Collects per-stage CPU and memory, stack samples and a cProfile."""
+
+    def __init__(self, directory: str, budgets: Optional[Dict[str, float]] = None,
+                 interval: float = PROFILE_INTERVAL_MS / 1000) -> None:
+        self.directory = directory
+        self.budgets = dict(budgets or {})
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stacks: Dict[int, List[_Frame]] = {}
+        self._stats: Dict[str, _StageStats] = {}
+        self._samples: Counter = Counter()
+        self._violations: Dict[str, Tuple[int, float]] = {}
+        self._cpu_profile = cProfile.Profile()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def start(self) -> "Profiler":
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACE_FRAMES)
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._sampler.start()
+        self._cpu_profile.enable()
+        return self
+
+    def stop(self) -> None:
+        self._cpu_profile.disable()
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+
+    def _fold_peak(self) -> None:
+        """Charges the peak since the last reset to every open stage, then resets it.
+
+        Only the sampler resets tracemalloc's peak, and always after this
+        charge, so a stage never loses an allocation to a reset made on
+        behalf of another thread. Callers hold self._lock.
+        """
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for stack in self._stacks.values():
+            for frame in stack:
+                frame.peak = max(frame.peak, peak)
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                self._fold_peak()
+                stages = {
+                    thread_id: [f"[{frame.name}]" for frame in stack]
+                    for thread_id, stack in self._stacks.items()
+                }
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                calls = []
+                while frame is not None:
+                    calls.append(_label(frame.f_code))
+                    frame = frame.f_back
+                self._samples[";".join(stages.get(thread_id, []) + calls[::-1])] += 1
+
+    def span_enter(self, name: str) -> None:
+        current, _ = tracemalloc.get_traced_memory()
+        with self._lock:
+            self._stacks.setdefault(threading.get_ident(), []).append(_Frame(name, current))
+
+    def span_exit(self, name: str) -> None:
+        with self._lock:
+            stack = self._stacks.get(threading.get_ident())
+            if not stack:
+                return
+            frame = stack.pop()
+            current, peak = tracemalloc.get_traced_memory()
+            # The peak since the sampler's last reset may predate this stage,
+            # which only ever overcharges it.
+            frame.peak = max(frame.peak, peak)
+            growth = frame.peak - frame.start_bytes
+            stats = self._stats.setdefault(frame.name, _StageStats())
+            stats.calls += 1
+            stats.cpu += time.thread_time() - frame.start_cpu
+            stats.peak_growth = max(stats.peak_growth, growth)
+            stats.net += current - frame.start_bytes
+            budget = self.budgets.get(frame.name, self.budgets.get("*"))
+            if budget is not None and growth > budget:
+                worst = self._violations.get(frame.name, (0, budget))[0]
+                self._violations[frame.name] = (max(worst, growth), budget)
+                metrics.incr("memory_budget_exceeded", stage=frame.name)
+
+    def report(self) -> str:
+        """Renders the per-stage table, top allocators and top CPU functions."""
+        out = io.StringIO()
+        current, peak = tracemalloc.get_traced_memory()
+        rss = _peak_rss_bytes()
+        out.write(f"peak RSS: {rss / MIB:.1f} MiB\n" if rss else "peak RSS: n/a\n")
+        out.write(f"traced memory: {current / MIB:.1f} MiB now, {peak / MIB:.1f} MiB peak since last sample\n\n")
+
+        out.write(f"{'stage':<28}{'calls':>7}{'cpu ms':>11}{'peak MiB':>11}{'net MiB':>10}{'budget':>9}\n")
+        with self._lock:
+            stages = sorted(self._stats.items(), key=lambda item: item[1].peak_growth, reverse=True)
+            for name, stats in stages:
+                budget = self.budgets.get(name, self.budgets.get("*"))
+                out.write(
+                    f"{name:<28}{stats.calls:>7}{stats.cpu * 1000:>11.1f}{stats.peak_growth / MIB:>11.2f}"
+                    f"{stats.net / MIB:>10.2f}{budget / MIB if budget is not None else '-':>9}\n"
+                )
+
+        out.write("\ntop allocators (live traced memory by line)\n")
+        # Leave out the profiler's own bookkeeping and module imports
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, path)
+            for path in (tracemalloc.__file__, cProfile.__file__, __file__, "<frozen importlib.*")
+        ])
+        for stat in snapshot.statistics("lineno")[:PROFILE_TOP]:
+            frame = stat.traceback[0]
+            out.write(f"{stat.size / 1024:>10.1f} KiB {stat.count:>8} blocks  {frame.filename}:{frame.lineno}\n")
+
+        out.write("\ntop functions (profiling thread, cumulative)\n")
+        cpu = io.StringIO()
+        pstats.Stats(self._cpu_profile, stream=cpu).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        out.write(cpu.getvalue())
+        return out.getvalue()
+
+    def finish(self) -> Optional[str]:
+        """Writes this run's profile files and starts a fresh run.
+
+        Returns the path prefix written. Raises MemoryBudgetExceeded after
+        writing if any stage went over its budget.
+        """
+        self.stop()
+        prefix = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(f"{prefix}.folded", "w", encoding="utf-8") as f:
+                for stack, count in sorted(self._samples.items()):
+                    f.write(f"{stack} {count}\n")
+            self._cpu_profile.dump_stats(f"{prefix}.pstats")
+            with open(f"{prefix}.txt", "w", encoding="utf-8") as f:
+                f.write(self.report())
+        finally:
+            violations = self._violations
+            with self._lock:
+                self._stats.clear()
+                self._samples.clear()
+                self._violations = {}
+            self._cpu_profile = cProfile.Profile()
+            self.start()
+        if violations:
+            raise MemoryBudgetExceeded("; ".join(
+                f"{name} grew {growth / MIB:.1f} MiB (budget {budget / MIB:.1f} MiB)"
+                for name, (growth, budget) in violations.items()
+            ))
+        return prefix
+
+
+_profiler: Optional[Profiler] = None
+
+
+def start(directory: Optional[str] = PROFILE_DIR) -> Optional[Profiler]:
+    """Starts profiling into directory and routes metrics spans through it."""
+    global _profiler
+    if _profiler is None and directory:
+        metrics.enable()
+        _profiler = Profiler(directory, PROFILE_MEMORY_BUDGETS).start()
+        metrics.set_observer(_profiler)
+    return _profiler
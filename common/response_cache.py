@@ -0,0 +1,126 @@
+"""Persistent, size-bounded LRU cache of HTTP responses with their validators.
+
+Bodies are stored already parsed (marshal-encoded), so a ``304 Not Modified``
+hands back the cached object without downloading or re-parsing the JSON.
+Lookups only note their time in memory; those times reach the database in
+one batch with the next ``put`` or at exit, so a hit costs no transaction.
+"""
+import atexit
+import marshal
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional
+
+from common.cache import CACHE_DIR
+
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", os.path.join(CACHE_DIR, "responses.sqlite"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+
+class CachedResponse(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    value: Any
+
+
+class ResponseCache:
+    """Maps request keys to (validators, parsed body), evicting least recently used."""
+
+    def __init__(self, path: str = RESPONSE_CACHE_PATH, max_bytes: int = RESPONSE_CACHE_MAX_BYTES) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self._conn: Optional[sqlite3.Connection] = None
+        self._memory = {}
+        # key -> last lookup time not yet written to the database
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+                "body BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_used)")
+        return self._conn
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Returns the stored response for key and marks it recently used."""
+        with self._lock:
+            try:
+                if key in self._memory:
+                    self._touched[key] = time.time()
+                    return self._memory[key]
+                row = self._db().execute(
+                    "SELECT etag, last_modified, body FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                entry = CachedResponse(row[0], row[1], marshal.loads(row[2]))
+            except (sqlite3.Error, ValueError, EOFError, TypeError):
+                return None
+            self._memory[key] = entry
+            self._touched[key] = time.time()
+            return entry
+
+    def put(self, key: str, etag: Optional[str], last_modified: Optional[str], value: Any) -> None:
+        """Stores a response and evicts old entries past the size budget."""
+        try:
+            body = marshal.dumps(value)
+        except ValueError:
+            return
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            try:
+                db = self._db()
+                self._write_touched(db)
+                db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, etag, last_modified, body, len(body), time.time()),
+                )
+                self._evict(db)
+                db.commit()
+            except sqlite3.Error:
+                return
+            self._memory[key] = CachedResponse(etag, last_modified, value)
+            self._touched.pop(key, None)
+
+    def flush(self) -> None:
+        """Writes pending last-used times to the database."""
+        with self._lock:
+            if not self._touched:
+                return
+            try:
+                db = self._db()
+                self._write_touched(db)
+                db.commit()
+            except sqlite3.Error:
+                pass
+
+    def _write_touched(self, db: sqlite3.Connection) -> None:
+        """Applies pending last-used times in the caller's transaction, before eviction reads them."""
+        if self._touched:
+            db.executemany(
+                "UPDATE responses SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            self._touched.pop(key, None)
+            total -= size
+            if total <= self.max_bytes:
+                break
@@ -0,0 +1,157 @@
+"""Shared retry, backoff and rate-limit pacing for upstream calls.
+
+* ``RetryPolicy`` gives full-jitter exponential backoff and prefers a
+  server-supplied ``Retry-After`` when there is one.
+* ``TokenBucket`` paces requests per host within published limits. When a
+  response reports its remaining quota as exhausted, the bucket holds further
+  requests until the advertised reset time.
+* A per-run deadline (RUN_DEADLINE seconds, reset by ``start_deadline``) caps
+  the total time spent waiting, so a run never sleeps past its slot.
+"""
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Dict, Mapping, Optional, Tuple
+
+from common import metrics
+
+RUN_DEADLINE = float(os.getenv("RUN_DEADLINE", "600"))
+
+# Sustained requests per second and burst size for each upstream host.
+HOST_RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    "api.coingecko.com": (0.5, 5),        # ~30 calls/minute on the public API
+    "min-api.cryptocompare.com": (20, 20),
+    "api.twitter.com": (1, 5),
+    "upload.twitter.com": (5, 10),
+}
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+_deadline = time.monotonic() + RUN_DEADLINE
+
+
+def start_deadline(seconds: float = RUN_DEADLINE) -> None:
+    """Starts a new run budget of seconds from now."""
+    global _deadline
+    _deadline = time.monotonic() + seconds
+
+
+def time_left() -> float:
+    return _deadline - time.monotonic()
+
+
+def sleep(seconds: float) -> bool:
+    """Sleeps unless that would overrun the deadline; returns False if it would."""
+    if seconds > time_left():
+        metrics.incr("deadline_exceeded")
+        return False
+    if seconds > 0:
+        time.sleep(seconds)
+    return True
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Converts a Retry-After header (seconds or HTTP date) to seconds from now."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class RetryPolicy:
+    """Full-jitter exponential backoff, capped at max_delay."""
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 30.0) -> None:
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Seconds to wait before retry number attempt + 1."""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay * 4)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+DEFAULT_POLICY = RetryPolicy(
+    max_attempts=int(os.getenv("RETRY_MAX_ATTEMPTS", "4")),
+    base_delay=float(os.getenv("RETRY_BASE_DELAY", "1")),
+)
+
+
+class TokenBucket:
+    """Thread-safe token bucket that can also be paused until a reset time."""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause_until(self, monotonic_time: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, monotonic_time)
+            self._tokens = 0.0
+
+    def acquire(self) -> bool:
+        """Waits for a token; returns False if the wait would pass the deadline."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._paused_until:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return True
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    wait = self._paused_until - now
+            metrics.incr("rate_limit_waits")
+            if not sleep(wait):
+                return False
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket_for(host: Optional[str]) -> Optional[TokenBucket]:
+    """Returns the shared bucket for host, or None for unlimited hosts."""
+    if host not in HOST_RATE_LIMITS:
+        return None
+    with _buckets_lock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(*HOST_RATE_LIMITS[host])
+        return _buckets[host]
+
+
+def note_quota(host: Optional[str], headers: Mapping[str, str]) -> None:
+    """Pauses host's bucket when rate-limit headers say the quota is spent."""
+    bucket = bucket_for(host)
+    if bucket is None:
+        return
+    remaining = headers.get("x-rate-limit-remaining") or headers.get("x-ratelimit-remaining")
+    reset = headers.get("x-rate-limit-reset") or headers.get("x-ratelimit-reset")
+    if remaining is None or reset is None:
+        return
+    try:
+        if int(remaining) > 0:
+            return
+        reset_at = float(reset)
+    except ValueError:
+        return
+    # Twitter sends an epoch timestamp; others send seconds until reset.
+    seconds = reset_at - time.time() if reset_at > 1e9 else reset_at
+    bucket.pause_until(time.monotonic() + max(0.0, seconds))
@@ -0,0 +1,102 @@
+"""Import-time report and cold-start budget check for the entry points.
+
+    python -m common.startup report app updates.bot post.update_data
+    python -m common.startup check --budget-ms 400 app updates.bot
+
+``report`` runs each module's import under ``-X importtime`` in a fresh
+interpreter and lists the slowest imports. ``check`` times a cold
+``import <module>`` several times and exits non-zero when the median exceeds
+the budget, so it can guard against startup regressions in CI.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, NamedTuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = ["app", "updates.bot", "post.update_data"]
+DEFAULT_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "500"))
+
+
+class ImportTime(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+
+
+def _run_import(module: str, *flags: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *flags, "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+
+
+def import_times(module: str) -> List[ImportTime]:
+    """Returns per-package import times for a cold import of module."""
+    result = _run_import(module, "-X", "importtime")
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.strip()}")
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times.append(ImportTime(name.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+
+def cold_start_ms(module: str, runs: int = 5) -> float:
+    """Returns the median wall time of a fresh interpreter importing module."""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = _run_import(module)
+        samples.append((time.perf_counter() - start) * 1000)
+        if result.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{result.stderr.strip()}")
+    return statistics.median(samples)
+
+
+def report(modules: List[str], top: int) -> int:
+    for module in modules:
+        times = import_times(module)
+        total = max((t.cumulative_us for t in times), default=0)
+        print(f"{module}: {total / 1000:.1f} ms total import time")
+        for t in sorted(times, key=lambda t: t.self_us, reverse=True)[:top]:
+            print(f"  {t.self_us / 1000:8.1f} ms self  {t.cumulative_us / 1000:8.1f} ms cumulative  {t.module}")
+    return 0
+
+
+def check(modules: List[str], budget_ms: float, runs: int) -> int:
+    failed = False
+    for module in modules:
+        elapsed = cold_start_ms(module, runs)
+        status = "ok" if elapsed <= budget_ms else "OVER BUDGET"
+        failed = failed or elapsed > budget_ms
+        print(f"{module}: {elapsed:.1f} ms cold start (budget {budget_ms:.0f} ms) {status}")
+    return 1 if failed else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure entry point startup cost.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    report_parser = commands.add_parser("report", help="list the slowest imports")
+    report_parser.add_argument("modules", nargs="*", default=ENTRY_POINTS)
+    report_parser.add_argument("--top", type=int, default=15)
+    check_parser = commands.add_parser("check", help="fail if cold start exceeds the budget")
+    check_parser.add_argument("modules", nargs="*", default=ENTRY_POINTS)
+    check_parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    check_parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "report":
+        return report(args.modules, args.top)
+    return check(args.modules, args.budget_ms, args.runs)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""Fixed-width, memory-mapped ring buffers of price snapshots, one per coin.
+
+Each file holds a small header followed by ``capacity`` records of four
+float64 columns (timestamp, price, market cap, volume). Appending overwrites
+the oldest slot in O(1). Window queries read the columns straight out of the
+mapping; with NumPy the stats and moving averages are computed on the column
+arrays, and a pure-Python path over ``memoryview`` stands in without it.
+"""
+import mmap
+import os
+import struct
+import time
+from typing import Any, Dict, List, Optional
+
+from common.cache import CACHE_DIR
+
+TIMESERIES_DIR = os.path.join(CACHE_DIR, "timeseries")
+DEFAULT_CAPACITY = int(os.getenv("TIMESERIES_CAPACITY", "4096"))
+
+# Snapshots closer together than this are dropped (e.g. served from cache).
+MIN_INTERVAL = 60
+
+# Snapshots averaged by the moving average in stats(); hourly snapshots make
+# it a 24-hour average.
+MOVING_AVERAGE_POINTS = int(os.getenv("MOVING_AVERAGE_POINTS", "24"))
+
+MAGIC = b"TPSERIES"
+HEADER = struct.Struct("<8sIQ4x")  # magic, capacity, records ever appended
+COLUMNS = ("timestamp", "price", "market_cap", "volume")
+RECORD = struct.Struct("<4d")
+
+DAY = 24 * 3600
+WEEK = 7 * DAY
+
+_UNSET = object()
+_np: Any = _UNSET
+
+
+def _numpy() -> Any:
+    """Returns NumPy, imported on first use, or None when it is not installed.
+
+    Importing it costs tens of milliseconds, so entry points that import this
+    module only pay for it once they query a window.
+    """
+    global _np
+    if _np is _UNSET:
+        try:
+            import numpy
+        except ImportError:  # NumPy is optional; the pure-Python path is fine at this size.
+            numpy = None
+        _np = numpy
+    return _np
+
+
+class PriceSeries:
+    """Ring buffer of (timestamp, price, market_cap, volume) for one coin."""
+
+    def __init__(self, path: str, capacity: int = DEFAULT_CAPACITY) -> None:
+        self.path = path
+        size = HEADER.size + capacity * RECORD.size
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER.size
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "r+b" if exists else "w+b")
+        if exists:
+            magic, capacity, _ = HEADER.unpack(self._file.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a price series file")
+            size = HEADER.size + capacity * RECORD.size
+        else:
+            self._file.write(HEADER.pack(MAGIC, capacity, 0))
+            self._file.truncate(size)
+        self.capacity = capacity
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+    @property
+    def appended(self) -> int:
+        return HEADER.unpack_from(self._map, 0)[2]
+
+    def __len__(self) -> int:
+        return min(self.appended, self.capacity)
+
+    def latest_timestamp(self) -> Optional[float]:
+        appended = self.appended
+        if not appended:
+            return None
+        slot = (appended - 1) % self.capacity
+        return RECORD.unpack_from(self._map, HEADER.size + slot * RECORD.size)[0]
+
+    def append(self, price: float, market_cap: float = 0.0, volume: float = 0.0,
+               timestamp: Optional[float] = None) -> bool:
+        """Writes one snapshot over the oldest slot; returns False if too soon."""
+        timestamp = time.time() if timestamp is None else timestamp
+        latest = self.latest_timestamp()
+        if latest is not None and timestamp - latest < MIN_INTERVAL:
+            return False
+        appended = self.appended
+        slot = appended % self.capacity
+        RECORD.pack_into(
+            self._map, HEADER.size + slot * RECORD.size,
+            timestamp, price or 0.0, market_cap or 0.0, volume or 0.0,
+        )
+        HEADER.pack_into(self._map, 0, MAGIC, self.capacity, appended + 1)
+        return True
+
+    def _table(self, np: Any, since: Optional[float] = None) -> Any:
+        """Returns the records as a (count, 4) array in time order."""
+        count, appended = len(self), self.appended
+        start = appended % self.capacity if appended > self.capacity else 0
+        body = memoryview(self._map)[HEADER.size:HEADER.size + self.capacity * RECORD.size]
+        table = np.frombuffer(body, dtype="<f8").reshape(self.capacity, 4)
+        table = np.roll(table, -start, axis=0)[:count]
+        if since is not None:
+            table = table[table[:, 0] >= since]
+        return table
+
+    def columns(self, since: Optional[float] = None) -> Dict[str, List[float]]:
+        """Returns each column in time order, optionally from ``since`` onwards."""
+        np = _numpy()
+        if np is not None:
+            table = self._table(np, since)
+            return {name: table[:, i].tolist() for i, name in enumerate(COLUMNS)}
+
+        count, appended = len(self), self.appended
+        start = appended % self.capacity if appended > self.capacity else 0
+        body = memoryview(self._map)[HEADER.size:HEADER.size + self.capacity * RECORD.size]
+        values = body.cast("d")
+        result = {}
+        for i, name in enumerate(COLUMNS):
+            column = values[i::4].tolist()
+            result[name] = (column[start:] + column[:start])[:count]
+        if since is not None:
+            keep = [ts >= since for ts in result["timestamp"]]
+            result = {name: [v for v, k in zip(column, keep) if k] for name, column in result.items()}
+        return result
+
+    def moving_average(self, points: int = MOVING_AVERAGE_POINTS,
+                       since: Optional[float] = None) -> List[float]:
+        """Returns the rolling mean of price over each run of points snapshots.
+
+        Fewer snapshots than points give a single mean of all of them.
+        """
+        np = _numpy()
+        if np is not None:
+            prices = self._table(np, since)[:, 1]
+            return _rolling_mean_array(np, prices, points).tolist()
+        return _rolling_mean_list(self.columns(since)["price"], points)
+
+    def stats(self, window: float, now: Optional[float] = None,
+              points: int = MOVING_AVERAGE_POINTS) -> Optional[Dict[str, float]]:
+        """Summarises prices over the trailing window, or None if it is not covered.
+
+        The window counts as covered when the oldest snapshot is at least 90%
+        of the window old, so hourly sampling jitter does not hide a result.
+        ``moving_average`` is the latest rolling mean over points snapshots.
+        """
+        now = time.time() if now is None else now
+        np = _numpy()
+        if np is not None:
+            table = self._table(np, since=now - window)
+            timestamps, prices = table[:, 0], table[:, 1]
+            if len(prices) < 2 or now - timestamps[0] < window * 0.9:
+                return None
+            first, last = prices[0], prices[-1]
+            return {
+                "change_pct": float((last - first) / first * 100) if first else 0.0,
+                "high": float(prices.max()),
+                "low": float(prices.min()),
+                "average": float(prices.mean()),
+                "moving_average": float(_rolling_mean_array(np, prices, points)[-1]),
+            }
+
+        data = self.columns(since=now - window)
+        prices = data["price"]
+        if len(prices) < 2 or now - data["timestamp"][0] < window * 0.9:
+            return None
+        first, last = prices[0], prices[-1]
+        return {
+            "change_pct": (last - first) / first * 100 if first else 0.0,
+            "high": max(prices),
+            "low": min(prices),
+            "average": sum(prices) / len(prices),
+            "moving_average": _rolling_mean_list(prices, points)[-1],
+        }
+
+    def close(self) -> None:
+        self._map.flush()
+        self._map.close()
+        self._file.close()
+
+
+def _rolling_mean_array(np: Any, values: Any, points: int) -> Any:
+    points = max(1, min(points, len(values)))
+    sums = np.cumsum(np.concatenate(([0.0], values)))
+    return (sums[points:] - sums[:-points]) / points
+
+
+def _rolling_mean_list(values: List[float], points: int) -> List[float]:
+    if not values:
+        return []
+    points = max(1, min(points, len(values)))
+    total = sum(values[:points])
+    means = [total / points]
+    for i in range(points, len(values)):
+        total += values[i] - values[i - points]
+        means.append(total / points)
+    return means
+
+
+class PriceStore:
+    """Opens one PriceSeries per coin id under a directory."""
+
+    def __init__(self, directory: str = TIMESERIES_DIR) -> None:
+        self.directory = directory
+        self._series: Dict[str, PriceSeries] = {}
+
+    def series(self, coin_id: str) -> PriceSeries:
+        if coin_id not in self._series:
+            self._series[coin_id] = PriceSeries(os.path.join(self.directory, f"{coin_id}.series"))
+        return self._series[coin_id]
+
+    def record(self, coin_id: str, price: float, market_cap: float = 0.0, volume: float = 0.0) -> bool:
+        return self.series(coin_id).append(price, market_cap, volume)
+
+    def stats(self, coin_id: str, window: float) -> Optional[Dict[str, float]]:
+        return self.series(coin_id).stats(window)
+
+    def close(self) -> None:
+        for series in self._series.values():
+            series.close()
+        self._series.clear()
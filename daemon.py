@@ -0,0 +1,128 @@
+"""Runs the Twitter, Telegram and markdown jobs in one warm process.
+
+The cron workflows start a fresh interpreter for every run. Here the jobs
+share one process instead, so the pooled HTTP session, the TTL and response
+caches, and the loaded post history stay warm between runs.
+
+    python daemon.py                    # schedule every job
+    python daemon.py --jobs telegram    # schedule a subset
+    python daemon.py --once             # run each job once and exit
+"""
+import argparse
+import importlib
+import os
+import sys
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Minutes between runs, matching the existing cron schedules
+JOB_INTERVALS = {
+    'twitter': int(os.environ.get('TWITTER_INTERVAL_MINUTES', '30')),
+    'telegram': int(os.environ.get('TELEGRAM_INTERVAL_MINUTES', '30')),
+    'markdown': int(os.environ.get('MARKDOWN_INTERVAL_MINUTES', '60')),
+}
+
+_twitter_bot = None
+
+
+def run_twitter():
+    """Post news and signals, reusing one TwitterBot and its history."""
+    global _twitter_bot
+    if _twitter_bot is None:
+        _twitter_bot = importlib.import_module('app').TwitterBot()
+    _twitter_bot.post_updates()
+
+
+def run_telegram():
+    importlib.import_module('updates.bot').main()
+
+
+def run_markdown():
+    importlib.import_module('post.update_data').main()
+
+
+JOBS = {
+    'twitter': run_twitter,
+    'telegram': run_telegram,
+    'markdown': run_markdown,
+}
+
+
+def run_job(name):
+    """Run one job, logging failures instead of stopping the daemon."""
+    from common import metrics, retry
+
+    print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] Running {name} job")
+    # Each job gets the full per-run retry budget and its own metrics
+    # snapshot, as a cron run would. Both are process-wide, which is why the
+    # scheduler runs one job at a time.
+    retry.start_deadline()
+    metrics.reset()
+    try:
+        JOBS[name]()
+    except (Exception, SystemExit) as e:
+        print(f"Error in {name} job: {e}")
+        return False
+    return True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--jobs', nargs='+', choices=sorted(JOBS), default=sorted(JOBS),
+                        help='jobs to run (default: all)')
+    parser.add_argument('--once', action='store_true',
+                        help='run each selected job once and exit')
+    return parser.parse_args(argv)
+
+
+def create_scheduler(scheduler_class):
+    """Return a scheduler that runs jobs one at a time, none ever skipped.
+
+    Jobs share the retry deadline, metrics and post history, so there is a
+    single worker. A job that comes due meanwhile waits its turn: without
+    misfire_grace_time=None APScheduler would drop any job still queued a
+    second after its run time.
+    """
+    from apscheduler.executors.pool import ThreadPoolExecutor
+
+    return scheduler_class(
+        executors={'default': ThreadPoolExecutor(max_workers=1)},
+        job_defaults={'misfire_grace_time': None, 'coalesce': True, 'max_instances': 1},
+    )
+
+
+def schedule_jobs(scheduler, names, start=None):
+    """Add each named job at its interval, all first due at start (default now)."""
+    start = start or datetime.now()
+    for name in names:
+        scheduler.add_job(
+            run_job, 'interval', args=[name], id=name,
+            minutes=JOB_INTERVALS[name], next_run_time=start
+        )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # The jobs use paths relative to the repository root.
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+
+    if args.once:
+        results = [run_job(name) for name in args.jobs]
+        return 0 if all(results) else 1
+
+    from apscheduler.schedulers.blocking import BlockingScheduler
+
+    scheduler = create_scheduler(BlockingScheduler)
+    schedule_jobs(scheduler, args.jobs)
+    print(f"Scheduled jobs: {', '.join(args.jobs)}")
+    try:
+        scheduler.start()
+    except (KeyboardInterrupt, SystemExit):
+        print("Daemon stopped.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
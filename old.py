@@ -1,13 +1,16 @@
-import requests
 import random
 import os
-import json
 import base64
 from datetime import datetime, timedelta
-from requests_oauthlib import OAuth1Session
-import tempfile
 from urllib.parse import urlparse
 
+from common import http_client, media, metrics
+from common.catalog import Catalog
+from common.dedupe_index import ExpiryIndex
+from common.history_store import PostHistory
+from common.media_cache import MediaCache
+from common.pipeline import Pipeline, Stage
+
 # Twitter API configurations for both accounts
 TWITTER_ACCOUNTS = {
     'account1': {
@@ -25,13 +28,20 @@ TWITTER_ACCOUNTS = {
 }
 
 # API endpoints
-API_URL_POST = 'https://api.twitter.com/2/tweets'
-API_MEDIA_UPLOAD = 'https://upload.twitter.com/1.1/media/upload.json'
+API_URL_POST = f"{os.environ.get('TWITTER_API', 'https://api.twitter.com')}/2/tweets"
 
 # Repository information
 REPO_OWNER = 'likhonisaac'
 REPO_NAME = 'Terminals-Pumps'
-HISTORY_FILE = 'post_history.json'
+
+# Compiled catalog written by post/update_data.py
+CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'post', 'post.bin')
+
+# Window within which a catalog post is not repeated
+REPOST_WINDOW = timedelta(hours=24)
+
+# Images shipped in the checkout, attached to catalog posts
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images')
 IMAGE_FILES = [
     '2thUENv9.jpg',
     'GahDNdIbEAEexOA.jpg',
@@ -41,79 +51,54 @@ IMAGE_FILES = [
 
 class TwitterBot:
     def __init__(self):
-        self.posts_history = self.load_posts_history()
-        
-    def load_posts_history(self):
-        try:
-            if os.path.exists(HISTORY_FILE):
-                with open(HISTORY_FILE, 'r') as file:
-                    return json.load(file)
-        except Exception as e:
-            print(f"Error loading history: {e}")
-        return {'account1': {}, 'account2': {}}
+        self.history = PostHistory()
+        self.media_cache = MediaCache()
+        self.auth_sessions = {}
 
-    def save_posts_history(self):
+    @metrics.timed('load_posts')
+    def load_posts(self):
+        """Open the local compiled catalog, downloading post.json if it is missing."""
         try:
-            with open(HISTORY_FILE, 'w') as file:
-                json.dump(self.posts_history, file, indent=2)
-            print(f"Successfully saved history to {HISTORY_FILE}")
+            if os.path.exists(CATALOG_FILE):
+                return Catalog.open(CATALOG_FILE)
         except Exception as e:
-            print(f"Error saving history: {e}")
-
-    def load_posts(self):
+            print(f"Error opening catalog {CATALOG_FILE}: {e}")
         try:
             url = f'https://raw.githubusercontent.com/{REPO_OWNER}/{REPO_NAME}/main/post/post.json'
-            response = requests.get(url)
+            response = http_client.get(url)
             response.raise_for_status()
-            return response.json()['posts']
+            return Catalog.from_posts(response.json()['posts'])
         except Exception as e:
             print(f"Error loading posts: {e}")
-            return []
+            return None
 
-    def download_random_image(self):
-        """Download a random image from the repository."""
+    def select_random_image(self):
+        """Pick a random image from the checkout, optimised for upload."""
         try:
             image_file = random.choice(IMAGE_FILES)
-            image_url = f'https://raw.githubusercontent.com/{REPO_OWNER}/{REPO_NAME}/main/images/{image_file}'
-            
-            response = requests.get(image_url)
-            response.raise_for_status()
-            
-            # Create a temporary file
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-            temp_file.write(response.content)
-            temp_file.close()
-            
-            print(f"Successfully downloaded image: {image_file}")
-            return temp_file.name
+            image_path = self.media_cache.optimized(os.path.join(IMAGES_DIR, image_file))
+            print(f"Selected image: {image_file}")
+            return image_path
         except Exception as e:
-            print(f"Error downloading image: {e}")
+            print(f"Error preparing image: {e}")
             return None
 
+    @metrics.timed('upload_media')
     def upload_media(self, image_path, auth):
         """Upload media to Twitter and return the media ID."""
         try:
-            # Read the image file
-            with open(image_path, 'rb') as image_file:
-                image_data = image_file.read()
-            
-            # Upload the image
-            response = auth.post(API_MEDIA_UPLOAD, files={'media': image_data})
-            response.raise_for_status()
-            
-            media_id = response.json()['media_id_string']
+            media_id = media.upload_file(auth, image_path)
             print(f"Successfully uploaded media with ID: {media_id}")
             return media_id
         except Exception as e:
             print(f"Error uploading media: {e}")
             return None
-        finally:
-            # Clean up the temporary file
-            if image_path and os.path.exists(image_path):
-                os.unlink(image_path)
 
-    def post_tweet(self, content, account_key, media_id=None):
-        try:
+    def get_auth_session(self, account_key):
+        """Return a pooled OAuth session for the account, created on first use."""
+        if account_key not in self.auth_sessions:
+            from requests_oauthlib import OAuth1Session
+
             account = TWITTER_ACCOUNTS[account_key]
             auth = OAuth1Session(
                 account['consumer_key'],
@@ -121,6 +106,13 @@ class TwitterBot:
                 resource_owner_key=account['access_token'],
                 resource_owner_secret=account['access_token_secret']
             )
+            self.auth_sessions[account_key] = http_client.configure_session(auth)
+        return self.auth_sessions[account_key]
+
+    @metrics.timed('post_tweet')
+    def post_tweet(self, content, account_key, media_id=None):
+        try:
+            auth = self.get_auth_session(account_key)
             
             # Prepare tweet payload
             payload = {'text': content}
@@ -134,22 +126,25 @@ class TwitterBot:
             print(f"Error posting tweet: {e}")
             return None, None
 
-    def is_recently_posted(self, post_id, account_key):
-        try:
-            account_history = self.posts_history[account_key]
-            if str(post_id) in account_history:
-                last_posted = datetime.fromisoformat(account_history[str(post_id)])
-                time_diff = datetime.now() - last_posted
-                return time_diff < timedelta(hours=24)
-        except Exception as e:
-            print(f"Error checking recent posts: {e}")
-        return False
+    def attach_media(self, tweet, account_key):
+        """Upload the tweet's image, if any; a failed upload posts without media."""
+        if tweet.get('image_path'):
+            auth = self.get_auth_session(account_key)
+            tweet['media_id'] = self.upload_media(tweet['image_path'], auth)
+        return tweet
+
+    def publish_tweet(self, tweet, account_key):
+        """Post a prepared tweet, returning it on success and None otherwise."""
+        response, _ = self.post_tweet(tweet['content'], account_key, tweet.get('media_id'))
+        if response and response.status_code in (200, 201):
+            return tweet
+        return None
 
     def post_updates(self):
         print(f"Starting post updates at {datetime.now()}")
         
-        posts = self.load_posts()
-        if not posts:
+        catalog = self.load_posts()
+        if not catalog:
             print("No posts available to tweet.")
             return
 
@@ -159,22 +154,24 @@ class TwitterBot:
         print(f"Using {account_key} for this update")
 
         # Filter out recently posted content
-        available_posts = [
-            p for p in posts 
-            if not self.is_recently_posted(p['id'], account_key)
-        ]
-
-        if not available_posts:
+        recent = ExpiryIndex(
+            REPOST_WINDOW.total_seconds(),
+            self.history.items(account_key),
+            universe=catalog.ids()
+        )
+        available_ids = recent.available()
+
+        if not available_ids:
             print(f"No available posts for {account_key} at this time.")
             return
 
-        # Download random image
-        image_path = self.download_random_image()
+        # Pick a random local image
+        image_path = self.select_random_image()
         if not image_path:
-            print("Failed to download image, proceeding without media")
+            print("Failed to prepare image, proceeding without media")
 
         # Select and post tweet
-        post_to_tweet = random.choice(available_posts)
+        post_to_tweet = catalog.get(int(random.choice(available_ids)))
         content = post_to_tweet['content']
         post_id = str(post_to_tweet['id'])
 
@@ -183,31 +180,30 @@ class TwitterBot:
         content_with_timestamp = f"{content}\n\nPosted at: {timestamp}"
 
         print(f"Attempting to post tweet {post_id} from {account_key}")
-        
-        media_id = None
-        if image_path:
-            # First create OAuth session for media upload
-            account = TWITTER_ACCOUNTS[account_key]
-            auth = OAuth1Session(
-                account['consumer_key'],
-                client_secret=account['consumer_secret'],
-                resource_owner_key=account['access_token'],
-                resource_owner_secret=account['access_token_secret']
-            )
-            media_id = self.upload_media(image_path, auth)
 
-        response, _ = self.post_tweet(content_with_timestamp, account_key, media_id)
-        
-        if response and response.status_code in (200, 201):
+        def commit(tweet):
+            self.history.mark(account_key, tweet['id'])
+            with metrics.span('save_history'):
+                self.history.commit()
+
+        pipeline = Pipeline(
+            Stage('media', lambda tweet: self.attach_media(tweet, account_key)),
+            Stage('publish', lambda tweet: self.publish_tweet(tweet, account_key)),
+        )
+        tweet = {'id': post_id, 'content': content_with_timestamp, 'image_path': image_path}
+        [outcome] = pipeline.run([tweet], commit=commit)
+
+        if outcome.result and not outcome.error:
             print(f"Successfully posted tweet from {account_key}: {post_id}")
-            self.posts_history[account_key][post_id] = datetime.now().isoformat()
-            self.save_posts_history()
         else:
             print(f"Failed to post tweet from {account_key}")
 
 def main():
     bot = TwitterBot()
-    bot.post_updates()
+    try:
+        bot.post_updates()
+    finally:
+        metrics.write_snapshot()
 
 if __name__ == "__main__":
     main()
@@ -2,20 +2,32 @@ import requests
 import json
 import os
 import logging
+import re
 from datetime import datetime
 import sys
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import market_data, metrics
+from common.artifacts import ArtifactWriter
+from common.catalog import assign_unique_ids, compile_catalog
+from common.markdown_renderer import SectionRenderer
+from common.timeseries import DAY, MOVING_AVERAGE_POINTS, WEEK, PriceStore
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# CoinGecko API URLs
-CRYPTO_API_URL = "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin,ethereum&vs_currencies=usd&include_market_cap=true&include_24hr_vol=true&include_24hr_change=true"
-TRENDING_API_URL = "https://api.coingecko.com/api/v3/search/trending"
+# Coins shown in the Live Prices section
+PRICE_COIN_IDS = ["bitcoin", "ethereum"]
+COIN_LABELS = {"bitcoin": "Bitcoin (BTC)", "ethereum": "Ethereum (ETH)"}
 
 # File paths
 POSTS_FILE = 'post/post.json'
+CATALOG_FILE = 'post/post.bin'
 MD_FILE = 'post/data.md'  # Adjusted to save markdown file as .md
 
+# Timestamp line ignored when deciding whether data.md actually changed
+LAST_UPDATED_LINE = re.compile(r'^\*\*Last updated:\*\*.*$', re.MULTILINE)
+
 def load_json(file_path):
     try:
         if not os.path.exists(file_path):
@@ -31,91 +43,179 @@ def load_json(file_path):
         logging.error(f"Failed to load JSON file: {e}")
         sys.exit(1)
 
-def save_json(data, file_path):
+@metrics.timed('save_json')
+def save_json(data, file_path, artifacts):
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
-        logging.info(f"JSON data saved to {file_path}")
+        artifacts.write_json(file_path, data, indent=4, ensure_ascii=False)
     except Exception as e:
         logging.error(f"Failed to save JSON file: {e}")
         sys.exit(1)
 
 def fix_duplicate_ids(data):
-    unique_id = 1
-    seen_ids = set()
-    for post in data.get("posts", []):
-        if post["id"] in seen_ids:
-            logging.info(f"Duplicate ID {post['id']} found. Assigning new ID: {unique_id}")
-            post["id"] = unique_id
-            unique_id += 1
-        seen_ids.add(post["id"])
+    for post in assign_unique_ids(data.get("posts", [])):
+        logging.info(f"Duplicate ID found. Assigned new ID: {post['id']}")
     logging.info("Duplicate IDs fixed")
     return data
 
+@metrics.timed('fetch_crypto_data')
 def fetch_crypto_data():
     try:
-        response = requests.get(CRYPTO_API_URL)
-        response.raise_for_status()
-        return response.json()
+        return market_data.get_simple_prices(PRICE_COIN_IDS)
     except requests.RequestException as e:
         logging.error(f"Failed to fetch cryptocurrency data: {e}")
         return None
 
+@metrics.timed('fetch_trending_data')
 def fetch_trending_data():
     try:
-        response = requests.get(TRENDING_API_URL)
-        response.raise_for_status()
-        return response.json()
+        return market_data.get_trending()
     except requests.RequestException as e:
         logging.error(f"Failed to fetch trending data: {e}")
         return None
 
-def create_markdown(crypto_data, trending_data, posts):
-    markdown_content = "# Cryptocurrency Data\n\n"
-    markdown_content += f"**Last updated:** {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC\n\n"
+@metrics.timed('enrich_trending')
+def enrich_trending(trending_data, crypto_data):
+    """Returns a copy of trending_data with USD price and market cap on every coin.
+
+    Costs no request beyond the ones fetch_crypto_data and
+    fetch_trending_data already made. Coins on the shared markets page take
+    their price and market cap from it; the rest use the USD price in the
+    trending payload, or price_btc times the BTC/USD rate in crypto_data.
+    The payload passed in belongs to the market data cache and is left
+    untouched.
+    """
+    if not (trending_data or {}).get("coins"):
+        return trending_data
+    trending_data = {
+        **trending_data,
+        "coins": [{**coin, "item": dict(coin["item"])} for coin in trending_data["coins"]],
+    }
+    coins = [coin["item"] for coin in trending_data["coins"]]
+    try:
+        prices = market_data.get_simple_prices((item["id"] for item in coins), fetch_missing=False)
+    except requests.RequestException as e:
+        logging.error(f"Failed to read the markets page for trending prices: {e}")
+        prices = {}
+
+    btc_usd = (crypto_data or {}).get("bitcoin", {}).get("usd")
+    for item in coins:
+        price = prices.get(item["id"], {})
+        price_usd = price.get("usd")
+        if price_usd is None:
+            price_usd = (item.get("data") or {}).get("price")
+            if not isinstance(price_usd, (int, float)):
+                price_usd = None
+        if price_usd is None and btc_usd and item.get("price_btc") is not None:
+            price_usd = item["price_btc"] * btc_usd
+        item["price_usd"] = price_usd
+        item["market_cap_usd"] = price.get("usd_market_cap")
+    return trending_data
+
+def format_usd(value):
+    """Formats a USD amount, keeping significant digits below one dollar."""
+    if value is None:
+        return "N/A"
+    return f"${market_data.format_price(value)}"
 
-    markdown_content += "## Live Prices\n"
+def render_prices(out, crypto_data):
+    out.write("## Live Prices\n")
     if crypto_data:
         bitcoin = crypto_data.get("bitcoin", {})
         ethereum = crypto_data.get("ethereum", {})
 
-        markdown_content += f"- **Bitcoin (BTC)**: ${bitcoin.get('usd', 'N/A')} USD\n"
-        markdown_content += f"  - Market Cap: ${bitcoin.get('usd_market_cap', 'N/A')} USD\n"
-        markdown_content += f"  - 24h Volume: ${bitcoin.get('usd_24h_vol', 'N/A')} USD\n"
-        markdown_content += f"  - 24h Change: {bitcoin.get('usd_24h_change', 'N/A')}%\n\n"
+        out.write(f"- **Bitcoin (BTC)**: ${bitcoin.get('usd', 'N/A')} USD\n")
+        out.write(f"  - Market Cap: ${bitcoin.get('usd_market_cap', 'N/A')} USD\n")
+        out.write(f"  - 24h Volume: ${bitcoin.get('usd_24h_vol', 'N/A')} USD\n")
+        out.write(f"  - 24h Change: {bitcoin.get('usd_24h_change', 'N/A')}%\n\n")
 
-        markdown_content += f"- **Ethereum (ETH)**: ${ethereum.get('usd', 'N/A')} USD\n"
-        markdown_content += f"  - Market Cap: ${ethereum.get('usd_market_cap', 'N/A')} USD\n"
-        markdown_content += f"  - 24h Volume: ${ethereum.get('usd_24h_vol', 'N/A')} USD\n"
-        markdown_content += f"  - 24h Change: {ethereum.get('usd_24h_change', 'N/A')}%\n\n"
+        out.write(f"- **Ethereum (ETH)**: ${ethereum.get('usd', 'N/A')} USD\n")
+        out.write(f"  - Market Cap: ${ethereum.get('usd_market_cap', 'N/A')} USD\n")
+        out.write(f"  - 24h Volume: ${ethereum.get('usd_24h_vol', 'N/A')} USD\n")
+        out.write(f"  - 24h Change: {ethereum.get('usd_24h_change', 'N/A')}%\n\n")
     else:
-        markdown_content += "No live cryptocurrency data available.\n\n"
+        out.write("No live cryptocurrency data available.\n\n")
+
+def record_price_history(crypto_data):
+    """Appends this run's prices to the local series and returns 24h/7d stats."""
+    history = {}
+    store = PriceStore()
+    try:
+        for coin_id in PRICE_COIN_IDS:
+            coin = (crypto_data or {}).get(coin_id)
+            if coin and coin.get("usd"):
+                store.record(coin_id, coin["usd"], coin.get("usd_market_cap"), coin.get("usd_24h_vol"))
+            stats = {"24h": store.stats(coin_id, DAY), "7d": store.stats(coin_id, WEEK)}
+            if any(stats.values()):
+                history[coin_id] = stats
+    except (OSError, ValueError) as e:
+        logging.error(f"Failed to update price history: {e}")
+    finally:
+        store.close()
+    return history
+
+def render_history(out, history):
+    if not history:
+        return
+    out.write("## Price History\n")
+    for coin_id, stats in history.items():
+        out.write(f"- **{COIN_LABELS.get(coin_id, coin_id)}**\n")
+        for window, window_stats in stats.items():
+            if window_stats:
+                out.write(
+                    f"  - {window}: ${window_stats['low']:,.2f} – ${window_stats['high']:,.2f}, "
+                    f"avg ${window_stats['average']:,.2f}, "
+                    f"{MOVING_AVERAGE_POINTS}-point moving avg ${window_stats['moving_average']:,.2f}, "
+                    f"change {window_stats['change_pct']:+.2f}%\n"
+                )
+        out.write("\n")
 
-    markdown_content += "## Trending Coins\n"
+def render_trending(out, trending_data):
+    out.write("## Trending Coins\n")
     if trending_data and trending_data.get("coins"):
         for coin in trending_data["coins"]:
             item = coin["item"]
-            markdown_content += f"- **{item['name']} ({item['symbol'].upper()})**\n"
-            markdown_content += f"  - Market Cap Rank: {item['market_cap_rank']}\n"
-            markdown_content += f"  - Price (BTC): {item['price_btc']}\n"
-            markdown_content += f"  - [More Info](https://www.coingecko.com/en/coins/{item['slug']})\n\n"
+            out.write(f"- **{item['name']} ({item['symbol'].upper()})**\n")
+            out.write(f"  - Market Cap Rank: {item['market_cap_rank']}\n")
+            out.write(f"  - Price: {format_usd(item.get('price_usd'))} USD ({item['price_btc']:.10f} BTC)\n")
+            if item.get('market_cap_usd'):
+                out.write(f"  - Market Cap: {format_usd(item['market_cap_usd'])} USD\n")
+            out.write(f"  - [More Info](https://www.coingecko.com/en/coins/{item['slug']})\n\n")
     else:
-        markdown_content += "No trending coins available.\n\n"
+        out.write("No trending coins available.\n\n")
 
-    markdown_content += "## Posts\n"
+def render_posts(out, posts):
+    out.write("## Posts\n")
     for post in posts:
-        markdown_content += f"- **Post ID: {post['id']}**\n"
-        markdown_content += f"  - Content:\n```\n{post['content']}\n```\n\n"
+        out.write(f"- **Post ID: {post['id']}**\n")
+        out.write(f"  - Content:\n```\n{post['content']}\n```\n\n")
 
-    return markdown_content
+@metrics.timed('create_markdown')
+def create_markdown(crypto_data, trending_data, posts, history=None):
+    renderer = SectionRenderer()
+    renderer.write("# Cryptocurrency Data\n\n")
+    renderer.write(f"**Last updated:** {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC\n\n")
+    renderer.section("prices", crypto_data, render_prices)
+    renderer.section("history", history, render_history)
+    renderer.section("trending", trending_data, render_trending)
+    renderer.section("posts", posts, render_posts)
+    return renderer.getvalue()
 
-def save_markdown(content, file_path=MD_FILE):
+@metrics.timed('save_markdown')
+def save_markdown(content, artifacts, file_path=MD_FILE):
+    # The timestamp alone never justifies rewriting the file
+    artifacts.write(file_path, content, ignore=LAST_UPDATED_LINE)
+
+def flush_artifacts(artifacts):
+    """Writes every changed artifact once, atomically."""
     try:
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(content)
-        logging.info(f"Markdown data saved to {file_path}")
-    except Exception as e:
-        logging.error(f"Failed to save markdown file: {e}")
+        for path, written in artifacts.flush().items():
+            if written:
+                logging.info(f"Saved {path}")
+            else:
+                logging.info(f"{path} unchanged; skipped writing")
+    except OSError as e:
+        logging.error(f"Failed to save artifacts: {e}")
+        sys.exit(1)
 
 def main():
     input_file = POSTS_FILE
@@ -126,11 +226,6 @@ def main():
 
     data = load_json(input_file)
     data = fix_duplicate_ids(data)
-    save_json(data, input_file)
-
-    # Fetch cryptocurrency data and trending coins
-    crypto_data = fetch_crypto_data()
-    trending_data = fetch_trending_data()
     posts = data.get("posts", [])  # Ensure posts are extracted from the data dictionary
 
     # Update post with cryptocurrency data
@@ -138,14 +233,25 @@ def main():
         if post["id"] == 1:
             post["content"] = "🚀 SOLANA GIVEAWAY 🚀\n\n🎁 Win 2.6 $SOL (~$1300)\n\n🤝 Follow @likhon_decrypto & @fariacrypto\n❤️ RT & Like\n💬 Comment your wallet\n\n⏳ 48 hrs! #SolanaGiveaway #Crypto"
 
-    # Save updated posts
-    save_json(data, input_file)
+    # Updated posts, the compiled catalog the posting bot reads and data.md
+    # are all written together at the end of the run
+    artifacts = ArtifactWriter()
+    save_json(data, input_file, artifacts)
+    artifacts.write(CATALOG_FILE, compile_catalog(posts))
+
+    # Fetch cryptocurrency data and trending coins
+    crypto_data = fetch_crypto_data()
+    trending_data = enrich_trending(fetch_trending_data(), crypto_data)
+
+    history = record_price_history(crypto_data)
 
     # Create markdown content
-    markdown_content = create_markdown(crypto_data, trending_data, posts)
+    markdown_content = create_markdown(crypto_data, trending_data, posts, history)
 
     # Save markdown content to data.md
-    save_markdown(markdown_content)
+    save_markdown(markdown_content, artifacts)
+    flush_artifacts(artifacts)
+    metrics.write_snapshot()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,47 @@
+"""Unique post ids and lookups in the compiled catalog."""
+import os
+import tempfile
+import unittest
+
+from common.catalog import Catalog, assign_unique_ids, compile_catalog
+
+
+class AssignUniqueIdsTest(unittest.TestCase):
+    def test_reassigned_ids_skip_later_ids(self):
+        posts = [{"id": 1}, {"id": 2}, {"id": 2}, {"id": 3}, {"id": 1}]
+
+        duplicates = assign_unique_ids(posts)
+
+        self.assertEqual([post["id"] for post in posts], [1, 2, 4, 3, 5])
+        self.assertEqual([post["id"] for post in duplicates], [4, 5])
+
+
+class CatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.posts = [{"id": post_id, "title": f"Post {post_id}"} for post_id in (7, 3, 42, 10)]
+        fd, self.path = tempfile.mkstemp(suffix=".bin")
+        with os.fdopen(fd, "wb") as f:
+            f.write(compile_catalog(self.posts))
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_get_round_trips(self):
+        catalog = Catalog.open(self.path)
+
+        self.assertEqual(len(catalog), 4)
+        self.assertEqual(list(catalog.ids()), [3, 7, 10, 42])
+        for post in self.posts:
+            self.assertEqual(catalog.get(post["id"]), post)
+        self.assertIsNone(catalog.get(5))
+
+    def test_random_returns_a_catalog_post(self):
+        catalog = Catalog.open(self.path)
+
+        for _ in range(20):
+            self.assertIn(catalog.random(), self.posts)
+        self.assertIsNone(Catalog.from_posts([]).random())
+
+
+if __name__ == "__main__":
+    unittest.main()
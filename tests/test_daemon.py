@@ -0,0 +1,47 @@
+"""Scheduling the daemon's jobs in one worker."""
+import threading
+import time
+import unittest
+from unittest import mock
+
+from apscheduler.schedulers.background import BackgroundScheduler
+
+import daemon
+
+# Longer than APScheduler's default one-second misfire grace time
+JOB_SECONDS = 1.5
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_jobs_due_together_all_run_one_at_a_time(self):
+        ran = []
+        running = []
+        done = threading.Event()
+
+        def job(name):
+            def run():
+                running.append(name)
+                self.assertEqual(len(running), 1, "jobs overlapped")
+                time.sleep(JOB_SECONDS)
+                running.remove(name)
+                ran.append(name)
+                if len(ran) == 2:
+                    done.set()
+            return run
+
+        jobs = {'first': job('first'), 'second': job('second')}
+        intervals = {'first': 30, 'second': 30}
+        with mock.patch.dict(daemon.JOBS, jobs), mock.patch.dict(daemon.JOB_INTERVALS, intervals):
+            scheduler = daemon.create_scheduler(BackgroundScheduler)
+            daemon.schedule_jobs(scheduler, ['first', 'second'])
+            scheduler.start()
+            try:
+                self.assertTrue(done.wait(3 * JOB_SECONDS + 5), f"only ran {ran}")
+            finally:
+                scheduler.shutdown(wait=True)
+
+        self.assertEqual(sorted(ran), ['first', 'second'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+"""Paging the Telegram market table."""
+import unittest
+
+from updates import bot
+
+
+def coins(count):
+    return [
+        {
+            "id": f"coin-{rank}",
+            "name": f"Coin {rank}",
+            "symbol": f"c{rank}",
+            "current_price": 0.123456,
+            "market_cap": 12_345_678_901,
+            "price_change_percentage_24h": 1.5,
+            "price_change_percentage_7d": -2.25,
+            "market_cap_rank": rank,
+        }
+        for rank in range(1, count + 1)
+    ]
+
+
+class FormatDataTest(unittest.TestCase):
+    def test_pages_fit_in_utf16_units(self):
+        pages = bot.format_data(coins(250))
+
+        self.assertGreater(len(pages), 1)
+        for text, _ in pages:
+            self.assertLessEqual(bot.message_length(text), bot.MESSAGE_LIMIT)
+        self.assertEqual(sum(len(page_coins) for _, page_coins in pages), 250)
+
+    def test_emoji_outside_bmp_count_twice(self):
+        self.assertEqual(bot.message_length("💰 Price"), 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,23 @@
+"""Price formatting shared by the markdown page and the Telegram table."""
+import unittest
+
+from common.market_data import format_price
+
+
+class FormatPriceTest(unittest.TestCase):
+    def test_dollar_prices_get_two_decimals(self):
+        self.assertEqual(format_price(1234.5), "1,234.50")
+        self.assertEqual(format_price(0), "0.00")
+
+    def test_sub_dollar_prices_keep_significant_digits(self):
+        self.assertEqual(format_price(0.1234567), "0.1235")
+        self.assertEqual(format_price(0.000012), "0.000012")
+        self.assertEqual(format_price(3e-9), "0.000000003")
+
+    def test_never_fewer_than_two_decimals(self):
+        self.assertEqual(format_price(0.5), "0.50")
+        self.assertEqual(format_price(0.999999999), "1.00")
+
+
+if __name__ == "__main__":
+    unittest.main()
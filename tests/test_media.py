@@ -0,0 +1,128 @@
+"""Chunked media uploads against the local fake Twitter API."""
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from benchmarks.fake_servers import FakeConfig, FakeCryptoCompare, FakeTwitter, _media_upload
+from common import media
+
+# Three APPENDs, the last one short
+IMAGE_BYTES = 2 * media.MEDIA_CHUNK_SIZE + 1234
+
+
+class RecordingTwitter(FakeTwitter):
+    """FakeTwitter that keeps every upload command and can inject failures."""
+
+    def __init__(self, config: FakeConfig) -> None:
+        super().__init__(config)
+        self.commands = []
+        self.fail_appends = False
+        self.stuck_processing = False
+        self.routes = {
+            **FakeTwitter.routes,
+            ("POST", "/1.1/media/upload.json"): self._upload,
+            ("GET", "/1.1/media/upload.json"): self._upload,
+        }
+
+    def _upload(self, handler, params):
+        command = params.get("command")
+        if isinstance(command, bytes):
+            command = command.decode("utf-8")
+        self.commands.append((command, params))
+        if command == "APPEND" and self.fail_appends:
+            return 500, {"errors": [{"message": "injected failure"}]}
+        status, payload = _media_upload(handler, params)
+        if command in ("FINALIZE", "STATUS") and self.stuck_processing:
+            payload = {**payload, "processing_info": {"state": "in_progress", "check_after_secs": 0}}
+        return status, payload
+
+
+class UnsizedImageHandler(BaseHTTPRequestHandler):
+    """Serves an image without Content-Length, ending the body by closing."""
+
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.end_headers()
+        self.wfile.write(b"\x89PNG" + b"\x00" * (IMAGE_BYTES - 4))
+
+
+class UploadFromUrlTest(unittest.TestCase):
+    def setUp(self):
+        config = FakeConfig(latency_ms=0, jitter_ms=0, image_bytes=IMAGE_BYTES, seed=1)
+        self.twitter = RecordingTwitter(config).start()
+        self.images = FakeCryptoCompare(config).start()
+        self.unsized = ThreadingHTTPServer(("127.0.0.1", 0), UnsizedImageHandler)
+        self.unsized.daemon_threads = True
+        threading.Thread(target=self.unsized.serve_forever, daemon=True).start()
+
+        self.upload_url = media.MEDIA_UPLOAD_URL
+        media.MEDIA_UPLOAD_URL = f"{self.twitter.url}/1.1/media/upload.json"
+        self.auth = requests.Session()
+
+    def tearDown(self):
+        media.MEDIA_UPLOAD_URL = self.upload_url
+        self.auth.close()
+        for server in (self.twitter, self.images, self.unsized):
+            server.shutdown()
+            server.server_close()
+
+    def assert_uploaded(self, media_type):
+        commands = [command for command, _ in self.twitter.commands]
+        self.assertEqual(commands, ["INIT", "APPEND", "APPEND", "APPEND", "FINALIZE"])
+
+        init = self.twitter.commands[0][1]
+        self.assertEqual(int(init["total_bytes"]), IMAGE_BYTES)
+        self.assertEqual(init["media_type"], media_type)
+
+        appends = [params for command, params in self.twitter.commands if command == "APPEND"]
+        self.assertEqual([int(params["segment_index"]) for params in appends], [0, 1, 2])
+        self.assertEqual(
+            [len(params["media"]) for params in appends],
+            [media.MEDIA_CHUNK_SIZE, media.MEDIA_CHUNK_SIZE, 1234],
+        )
+
+    def test_sized_download_streams_into_chunks(self):
+        media_id = media.upload_from_url(self.auth, f"{self.images.url}/images/1.jpg")
+
+        self.assertEqual(media_id, "1")
+        self.assert_uploaded("image/jpeg")
+
+    def test_unsized_download_is_spooled_first(self):
+        host, port = self.unsized.server_address[:2]
+        media_id = media.upload_from_url(self.auth, f"http://{host}:{port}/image.png")
+
+        self.assertEqual(media_id, "1")
+        self.assert_uploaded("image/png")
+
+    def test_failed_append_stops_prefetching(self):
+        self.twitter.fail_appends = True
+
+        with self.assertRaises(requests.HTTPError):
+            media.upload_from_url(self.auth, f"{self.images.url}/images/1.jpg")
+
+        deadline = time.monotonic() + 5
+        while any(thread.name == "media-prefetch" for thread in threading.enumerate()):
+            self.assertLess(time.monotonic(), deadline, "prefetch thread still running")
+            time.sleep(0.01)
+
+    def test_status_polling_gives_up(self):
+        self.twitter.stuck_processing = True
+
+        with self.assertRaises(RuntimeError):
+            media.upload_from_url(self.auth, f"{self.images.url}/images/1.jpg")
+
+        commands = [command for command, _ in self.twitter.commands]
+        self.assertEqual(commands.count("STATUS"), media.MEDIA_STATUS_MAX_POLLS)
+
+
+if __name__ == "__main__":
+    unittest.main()
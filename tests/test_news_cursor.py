@@ -0,0 +1,70 @@
+"""Walking the news feed back to the per-account cursor."""
+import unittest
+
+import app
+
+
+def article(published_on):
+    return {"id": str(published_on), "published_on": published_on}
+
+
+class PagedNewsBot(app.TwitterBot):
+    """TwitterBot whose feed is a fixed list of pages; None marks a failed request."""
+
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.requests = []
+
+    def fetch_news(self, before=None):
+        self.requests.append(before)
+        return self.pages.pop(0)
+
+
+def page(newest, oldest):
+    return [article(t) for t in range(newest, oldest - 1, -1)]
+
+
+class FetchNewArticlesTest(unittest.TestCase):
+    def setUp(self):
+        self.max_pages = app.NEWS_MAX_PAGES
+        app.NEWS_MAX_PAGES = 3
+
+    def tearDown(self):
+        app.NEWS_MAX_PAGES = self.max_pages
+
+    def test_walks_back_to_cursor(self):
+        bot = PagedNewsBot([page(2000, 1951), page(1950, 1901)])
+
+        articles, reached = bot.fetch_new_articles((1920, "1920"))
+
+        self.assertTrue(reached)
+        self.assertEqual(bot.requests, [None, 1951])
+        self.assertEqual([a["published_on"] for a in articles], list(range(1921, 2001)))
+
+    def test_too_far_behind(self):
+        bot = PagedNewsBot([page(2000, 1951), page(1950, 1901), page(1900, 1851)])
+
+        articles, reached = bot.fetch_new_articles((1800, "1800"))
+
+        self.assertFalse(reached)
+        self.assertEqual(len(articles), 150)
+
+    def test_failed_page_is_not_the_cursor(self):
+        bot = PagedNewsBot([page(2000, 1951), None])
+
+        articles, reached = bot.fetch_new_articles((1800, "1800"))
+
+        self.assertFalse(reached)
+        self.assertEqual(articles, [])
+
+    def test_empty_page_reaches_cursor(self):
+        bot = PagedNewsBot([page(2000, 1951), []])
+
+        articles, reached = bot.fetch_new_articles((1800, "1800"))
+
+        self.assertTrue(reached)
+        self.assertEqual(len(articles), 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
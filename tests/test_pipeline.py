@@ -0,0 +1,114 @@
+"""Staged pipelines over bounded queues."""
+import random
+import threading
+import time
+import unittest
+from unittest import mock
+
+from common.pipeline import Pipeline, Stage
+
+
+def jittered(func):
+    """Wraps func so concurrent workers finish out of order."""
+    def run(value):
+        time.sleep(random.uniform(0, 0.01))
+        return func(value)
+    return run
+
+
+class PipelineTest(unittest.TestCase):
+    def run_pipeline(self, pipeline, items, commit=None):
+        """Runs the pipeline on a thread, failing instead of hanging."""
+        outcome = {}
+        thread = threading.Thread(
+            target=lambda: outcome.setdefault("results", pipeline.run(items, commit=commit)), daemon=True
+        )
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive(), "pipeline did not finish")
+        return outcome["results"]
+
+    def test_results_and_commits_in_input_order(self):
+        committed = []
+        pipeline = Pipeline(
+            Stage("double", jittered(lambda x: x * 2), workers=4),
+            Stage("inc", jittered(lambda x: x + 1), workers=3),
+            queue_size=2,
+        )
+
+        results = self.run_pipeline(pipeline, range(30), commit=committed.append)
+
+        self.assertEqual([r.item for r in results], list(range(30)))
+        self.assertEqual([r.result for r in results], [x * 2 + 1 for x in range(30)])
+        self.assertEqual(committed, [x * 2 + 1 for x in range(30)])
+
+    def test_ordered_stage_sees_input_order(self):
+        seen = []
+
+        def record(value):
+            seen.append(value)
+            return value
+
+        pipeline = Pipeline(
+            Stage("work", jittered(lambda x: x), workers=4),
+            Stage("publish", record, workers=4, ordered=True),
+        )
+
+        self.run_pipeline(pipeline, range(20))
+
+        self.assertEqual(seen, list(range(20)))
+
+    def test_stage_errors_do_not_stop_the_batch(self):
+        def check(value):
+            if value % 3 == 0:
+                raise ValueError(value)
+            return value
+
+        later = []
+        pipeline = Pipeline(Stage("check", check, workers=2), Stage("later", lambda x: later.append(x) or x))
+
+        results = self.run_pipeline(pipeline, range(7))
+
+        self.assertEqual([type(r.error) for r in results if r.error], [ValueError] * 3)
+        self.assertEqual([r.result for r in results if not r.error], [1, 2, 4, 5])
+        self.assertEqual(sorted(later), [1, 2, 4, 5])
+
+    def test_none_drops_the_item(self):
+        committed = []
+        later = []
+        pipeline = Pipeline(
+            Stage("odd", lambda x: x if x % 2 else None, workers=2),
+            Stage("later", lambda x: later.append(x) or x),
+        )
+
+        results = self.run_pipeline(pipeline, range(6), commit=committed.append)
+
+        self.assertEqual([r.result for r in results], [None, 1, None, 3, None, 5])
+        self.assertTrue(all(r.error is None for r in results))
+        self.assertEqual(committed, [1, 3, 5])
+        self.assertEqual(sorted(later), [1, 3, 5])
+
+    def test_empty_input(self):
+        pipeline = Pipeline(Stage("a", lambda x: x, workers=3), Stage("b", lambda x: x, ordered=True))
+
+        self.assertEqual(self.run_pipeline(pipeline, []), [])
+
+    def test_system_exit_in_a_stage_does_not_hang(self):
+        def stop(value):
+            if value == 2:
+                raise SystemExit("stop")
+            return value
+
+        pipeline = Pipeline(Stage("stop", stop), Stage("after", lambda x: x, workers=2), queue_size=1)
+
+        # The worker thread dies with SystemExit, which threading reports
+        with mock.patch("threading.excepthook"):
+            results = self.run_pipeline(pipeline, range(10))
+
+        self.assertEqual(len(results), 10)
+        self.assertEqual([r.result for r in results[:2]], [0, 1])
+        self.assertTrue(all(isinstance(r.error, SystemExit) for r in results[2:]))
+
+
+if __name__ == "__main__":
+    unittest.main()
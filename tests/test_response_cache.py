@@ -0,0 +1,52 @@
+"""Last-used bookkeeping in the on-disk response cache."""
+import os
+import tempfile
+import unittest
+
+from common.response_cache import ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "responses.sqlite")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_hits_do_not_write(self):
+        cache = ResponseCache(self.path)
+        cache.put("a", '"1"', None, {"value": 1})
+        writes = cache._db().total_changes
+
+        for _ in range(10):
+            self.assertEqual(cache.get("a").value, {"value": 1})
+
+        self.assertEqual(cache._db().total_changes, writes)
+
+    def test_eviction_sees_recent_hits(self):
+        cache = ResponseCache(self.path)
+        cache.put("old", None, None, "x" * 100)
+        cache.put("new", None, None, "y" * 100)
+        cache.get("old")
+        cache.max_bytes = 250
+
+        cache.put("newest", None, None, "z" * 100)
+
+        self.assertIsNotNone(cache.get("old"))
+        self.assertIsNone(cache.get("new"))
+
+    def test_flush_persists_last_used(self):
+        cache = ResponseCache(self.path)
+        cache.put("a", None, None, 1)
+        cache.get("a")
+        used = cache._touched["a"]
+
+        cache.flush()
+
+        row = cache._db().execute("SELECT last_used FROM responses WHERE key = 'a'").fetchone()
+        self.assertEqual(row[0], used)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,27 +1,50 @@
+import hashlib
 import os
-import time
+import re
+import sys
 import requests
 from datetime import datetime
-from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, ParseMode
-from telegram.error import TelegramError
-from typing import Optional, List, Dict, Any
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import cassette, market_data, metrics, retry
+from common.cache import TTLCache
+from common.pipeline import Pipeline, Stage
+from common.timeseries import DAY, WEEK, PriceStore
+
+if TYPE_CHECKING:
+    from telegram import Bot, InlineKeyboardMarkup
 
 # Direct API settings
-COINGECKO_URL = "https://api.coingecko.com/api/v3/coins/markets"
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 CHANNEL_ID = os.getenv("CHANNEL_ID")
 POST_ID = int(os.getenv("POST_ID", "7"))
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org/bot")
+
+# Messages edited in place, one per page of the table; further pages are sent
+# once and their ids remembered between runs
+POST_IDS = [int(i) for i in os.getenv("POST_IDS", str(POST_ID)).split(",") if i.strip()]
+# Telegram rejects message text longer than this many UTF-16 code units
+MESSAGE_LIMIT = 4096
+
+# Skip the edit unless some price moved by more than this many percent
+PRICE_TOLERANCE_PCT = float(os.getenv("PRICE_TOLERANCE_PCT", "0"))
+# Re-send at least this often so the "Last Updated" line does not go stale
+DASHBOARD_MAX_AGE = int(os.getenv("DASHBOARD_MAX_AGE", str(6 * 3600)))
 
-# Initialize the bot globally
-bot = Bot(token=BOT_TOKEN)
+# Created on first use so runs that exit early never import telegram
+_bot: Optional["Bot"] = None
 
 # Static message template with standard emojis
 MESSAGE_TEMPLATE = """
-⭐ *Top 4 Cryptocurrencies by Market Cap* ⭐
+⭐ *{title}* ⭐
 
 _Last Updated: {timestamp}_
 
-{crypto_data}
+{crypto_data}{footer}"""
+
+# Appended to the last page only
+FOOTER = """
 
 ⏰ Updates every 30 minutes
 💬 Join @InvisibleSolAI for more crypto updates!
@@ -38,69 +61,162 @@ CRYPTO_ITEM_TEMPLATE = """
 
 """
 
+TIMESTAMP_LINE = re.compile(r"^_Last Updated: .*_$", re.MULTILINE)
+
+# Last payload sent to the channel, persisted between runs
+_sent_state = TTLCache("telegram_dashboard", DASHBOARD_MAX_AGE)
+_message_ids = TTLCache("telegram_messages", 365 * DAY)
+_inline_keyboard: Optional["InlineKeyboardMarkup"] = None
+
 def log_message(message: str) -> None:
     """Logs a message with timestamp."""
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     print(f"[{timestamp}] {message}")
 
-def fetch_data(max_retries: int = 3, delay: int = 5) -> Optional[List[Dict[str, Any]]]:
-    """Fetches cryptocurrency data from CoinGecko."""
-    params = {
-        "vs_currency": "usd",
-        "order": "market_cap_desc",
-        "per_page": 4,
-        "page": 1,
-        "sparkline": False,
-        "price_change_percentage": "24h,7d"
-    }
-    
-    for attempt in range(max_retries):
-        try:
-            log_message("Fetching data from CoinGecko API...")
-            response = requests.get(
-                COINGECKO_URL,
-                params=params,
-                timeout=30,
-                headers={"Accept": "application/json"}
-            )
-            response.raise_for_status()
-            data = response.json()
-            log_message(f"Successfully fetched data for {len(data)} tokens.")
-            return data
-        except requests.RequestException as e:
-            log_message(f"Error fetching data (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                time.sleep(delay)
+@metrics.timed("fetch_data")
+def fetch_data() -> Optional[List[Dict[str, Any]]]:
+    """Fetches the top MARKET_TOP_N coins from the shared CoinGecko gateway.
+
+    Retries and rate limiting happen in the shared HTTP client.
+    """
+    try:
+        log_message("Fetching data from CoinGecko API...")
+        data = market_data.get_top_markets()
+        log_message(f"Successfully fetched data for {len(data)} tokens.")
+        return data
+    except requests.RequestException as e:
+        log_message(f"Error fetching data: {e}")
     return None
 
+def apply_local_history(data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Records this snapshot and returns copies of the rows with 24h/7d changes from local history.
+
+    Changes come from the local price series once it covers the window and
+    fall back to CoinGecko's figures until then. The rows passed in belong to
+    the market data cache and are left untouched.
+    """
+    data = [dict(item) for item in data]
+    store = PriceStore()
+    try:
+        for item in data:
+            store.record(item['id'], item.get('current_price'), item.get('market_cap'), item.get('total_volume'))
+            day = store.stats(item['id'], DAY)
+            week = store.stats(item['id'], WEEK)
+            if day:
+                item['price_change_percentage_24h'] = day['change_pct']
+            item['price_change_percentage_7d'] = (
+                week['change_pct'] if week else item.get('price_change_percentage_7d_in_currency') or 0
+            )
+    except (OSError, ValueError) as e:
+        log_message(f"Error updating local price history: {e}")
+    finally:
+        store.close()
+    return data
+
 def format_market_cap(market_cap: float) -> str:
     """Formats market cap with B/T suffix."""
     if market_cap >= 1_000_000_000_000:
         return f"${market_cap / 1_000_000_000_000:.2f}T"
     return f"${market_cap / 1_000_000_000:.2f}B"
 
-def format_data(data: List[Dict[str, Any]]) -> str:
-    """Formats data keeping static emojis intact."""
-    crypto_data = ""
-    for i, item in enumerate(data, 1):
-        crypto_data += CRYPTO_ITEM_TEMPLATE.format(
+def format_columns(data: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """Formats each table column in one pass over its values."""
+    def column(key: str) -> List[float]:
+        return [item.get(key) or 0 for item in data]
+
+    return {
+        "price": list(map(market_data.format_price, column('current_price'))),
+        "market_cap": list(map(format_market_cap, column('market_cap'))),
+        "change_24h": [f"{value:+.2f}" for value in column('price_change_percentage_24h')],
+        "change_7d": [f"{value:+.2f}" for value in column('price_change_percentage_7d')],
+    }
+
+def render_items(data: List[Dict[str, Any]]) -> List[str]:
+    """Renders one table entry per coin from the pre-formatted columns."""
+    columns = format_columns(data)
+    return [
+        CRYPTO_ITEM_TEMPLATE.format(
             rank=i,
             name=item['name'],
             symbol=item['symbol'].upper(),
-            price=f"{item.get('current_price', 0):,.2f}",
-            market_cap=format_market_cap(item.get('market_cap', 0)),
-            change_24h=f"{item.get('price_change_percentage_24h', 0):+.2f}",
-            change_7d=f"{item.get('price_change_percentage_7d', 0):+.2f}",
+            price=price,
+            market_cap=market_cap,
+            change_24h=change_24h,
+            change_7d=change_7d,
             market_rank=item.get('market_cap_rank', 'N/A')
         )
+        for i, (item, price, market_cap, change_24h, change_7d) in enumerate(
+            zip(data, columns["price"], columns["market_cap"], columns["change_24h"], columns["change_7d"]), 1
+        )
+    ]
 
-    return MESSAGE_TEMPLATE.format(
-        timestamp=datetime.now().strftime("%Y-%m-%d %H:%M UTC"),
-        crypto_data=crypto_data
-    )
+def page_title(count: int, page: int, pages: int) -> str:
+    """Returns the heading for one page of the table."""
+    title = f"Top {count} Cryptocurrencies by Market Cap"
+    return f"{title} ({page}/{pages})" if pages > 1 else title
+
+def message_length(text: str) -> int:
+    """Returns the length Telegram checks against MESSAGE_LIMIT.
+
+    Telegram counts UTF-16 code units, so each emoji outside the BMP
+    counts twice.
+    """
+    return len(text.encode("utf-16-le")) // 2
 
-def create_inline_keyboard() -> InlineKeyboardMarkup:
+def paginate(items: List[str], budget: int) -> List[List[int]]:
+    """Greedily groups item indexes so each page's items fit within budget UTF-16 code units."""
+    pages: List[List[int]] = [[]]
+    size = 0
+    for index, item in enumerate(items):
+        length = message_length(item)
+        if pages[-1] and size + length > budget:
+            pages.append([])
+            size = 0
+        pages[-1].append(index)
+        size += length
+    return pages
+
+@metrics.timed("format_data")
+def format_data(data: List[Dict[str, Any]]) -> List[Tuple[str, List[Dict[str, Any]]]]:
+    """Formats the table into Telegram-sized pages keeping static emojis intact.
+
+    Returns (text, coins) pairs, one per message, in display order.
+    """
+    items = render_items(data)
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M UTC")
+    # Reserve room for the longest possible title and the footer on every page
+    overhead = message_length(MESSAGE_TEMPLATE.format(
+        title=page_title(len(data), len(data), len(data)),
+        timestamp=timestamp,
+        crypto_data="",
+        footer=FOOTER
+    ))
+    pages = paginate(items, MESSAGE_LIMIT - overhead)
+    return [
+        (
+            MESSAGE_TEMPLATE.format(
+                title=page_title(len(data), page, len(pages)),
+                timestamp=timestamp,
+                crypto_data="".join(items[i] for i in indexes),
+                footer=FOOTER if page == len(pages) else ""
+            ),
+            [data[i] for i in indexes]
+        )
+        for page, indexes in enumerate(pages, 1)
+    ]
+
+def get_bot() -> "Bot":
+    """Returns the shared Bot client, importing telegram on first use."""
+    global _bot
+    if _bot is None:
+        from telegram import Bot
+        _bot = Bot(token=BOT_TOKEN, base_url=TELEGRAM_API_URL, request=cassette.telegram_request())
+    return _bot
+
+def create_inline_keyboard() -> "InlineKeyboardMarkup":
     """Creates inline keyboard with preview links."""
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
     keyboard = [
         [
             InlineKeyboardButton(
@@ -129,39 +245,130 @@ def create_inline_keyboard() -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def update_message_text(text: str, max_retries: int = 3) -> bool:
-    """Updates only the message text, preserving existing media and markup."""
+def get_inline_keyboard() -> "InlineKeyboardMarkup":
+    """Returns the static keyboard, built once per process."""
+    global _inline_keyboard
+    if _inline_keyboard is None:
+        _inline_keyboard = create_inline_keyboard()
+    return _inline_keyboard
+
+def fingerprint(text: str) -> str:
+    """Hashes the rendered message, ignoring the timestamp line."""
+    return hashlib.sha1(TIMESTAMP_LINE.sub("", text).encode("utf-8")).hexdigest()
+
+def price_snapshot(data: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Maps coin ids to current prices, in display order."""
+    return {item['id']: item.get('current_price') or 0 for item in data}
+
+def message_ids_key() -> str:
+    """Keys remembered page ids by channel and configured ids, so changing POST_IDS starts afresh."""
+    return f"{CHANNEL_ID}:{','.join(map(str, POST_IDS))}"
+
+def page_message_ids(count: int) -> List[Optional[int]]:
+    """Returns the message id for each page, or None where one must be sent."""
+    ids = _message_ids.get(message_ids_key()) or POST_IDS
+    return (list(ids) + [None] * count)[:count]
+
+def remember_message_ids(ids: List[Optional[int]]) -> None:
+    """Persists the message ids of the pages sent so far."""
+    known = list(_message_ids.get(message_ids_key()) or POST_IDS)
+    known += [None] * (len(ids) - len(known))
+    # Ids of pages beyond this run's count are kept so a longer table reuses them
+    merged = [sent if sent is not None else known[i] for i, sent in enumerate(ids)]
+    _message_ids.set(message_ids_key(), merged + known[len(ids):])
+
+def is_visible_change(text: str, prices: Dict[str, float], message_id: int = POST_ID) -> bool:
+    """Decides whether a dashboard page differs enough from what was last sent."""
+    last = _sent_state.get(f"{CHANNEL_ID}:{message_id}")
+    if not last:
+        return True
+    if last["fingerprint"] == fingerprint(text):
+        return False
+    if PRICE_TOLERANCE_PCT <= 0 or list(last["prices"]) != list(prices):
+        return True
+    for coin_id, price in prices.items():
+        previous = last["prices"][coin_id]
+        if not previous or abs(price - previous) / previous * 100 > PRICE_TOLERANCE_PCT:
+            return True
+    return False
+
+def remember_sent(text: str, prices: Dict[str, float], message_id: int = POST_ID) -> None:
+    """Persists the fingerprint and prices of a successfully sent dashboard page."""
+    _sent_state.set(f"{CHANNEL_ID}:{message_id}", {"fingerprint": fingerprint(text), "prices": prices})
+
+def send_message(text: str) -> int:
+    """Sends the text as a new channel message and returns its id."""
+    from telegram import ParseMode
+
+    message = get_bot().send_message(
+        chat_id=CHANNEL_ID,
+        text=text,
+        parse_mode=ParseMode.MARKDOWN,
+        reply_markup=get_inline_keyboard(),
+        disable_web_page_preview=True
+    )
+    log_message("Sent new message successfully.")
+    return message.message_id
+
+@metrics.timed("update_message")
+def update_message_text(text: str, message_id: Optional[int] = POST_ID, max_retries: int = 3) -> Optional[int]:
+    """Updates only the message text, preserving existing media and markup.
+
+    Sends a new message when message_id is None or no longer exists. Returns
+    the id of the message now showing the text, or None on failure.
+    """
+    from telegram import ParseMode
+    from telegram.error import TelegramError
+
+    bot = get_bot()
     for attempt in range(max_retries):
         try:
+            if message_id is None:
+                return send_message(text)
             bot.edit_message_text(
                 chat_id=CHANNEL_ID,
-                message_id=POST_ID,
+                message_id=message_id,
                 text=text,
                 parse_mode=ParseMode.MARKDOWN,
-                reply_markup=create_inline_keyboard(),
+                reply_markup=get_inline_keyboard(),
                 disable_web_page_preview=True
             )
-            log_message("Successfully updated message text.")
-            return True
+            log_message(f"Successfully updated message {message_id}.")
+            return message_id
         except TelegramError as e:
             log_message(f"Error updating message (attempt {attempt + 1}/{max_retries}): {e}")
+            if "message is not modified" in str(e):
+                return message_id
             if "message to edit not found" in str(e):
                 # If message doesn't exist, send new message
                 try:
-                    bot.send_message(
-                        chat_id=CHANNEL_ID,
-                        text=text,
-                        parse_mode=ParseMode.MARKDOWN,
-                        reply_markup=create_inline_keyboard(),
-                        disable_web_page_preview=True
-                    )
-                    log_message("Sent new message successfully.")
-                    return True
+                    return send_message(text)
                 except TelegramError as send_error:
                     log_message(f"Error sending new message: {send_error}")
             if attempt < max_retries - 1:
-                time.sleep(5)
-    return False
+                # RetryAfter carries Telegram's flood-control wait in seconds.
+                delay = retry.DEFAULT_POLICY.delay(attempt, getattr(e, "retry_after", None))
+                if not retry.sleep(delay):
+                    break
+                metrics.incr("retries", operation="update_message")
+    return None
+
+def gate_page(page: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Drops pages whose message already shows equivalent content."""
+    if page["message_id"] is not None and not is_visible_change(page["text"], page["prices"], page["message_id"]):
+        log_message(f"No visible change to page {page['page']} since last update; skipping edit.")
+        metrics.incr("skipped_updates")
+        return None
+    return page
+
+def publish_page(page: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Edits or sends one page, returning it with the id now showing it."""
+    sent_id = update_message_text(page["text"], page["message_id"])
+    if sent_id is None:
+        log_message(f"Failed to update page {page['page']}.")
+        return None
+    log_message(f"Page {page['page']} successfully updated.")
+    return {**page, "message_id": sent_id}
 
 def main() -> None:
     """Main execution with text-only updates."""
@@ -178,15 +385,30 @@ def main() -> None:
             log_message("Failed to fetch data; exiting.")
             return
 
-        formatted_text = format_data(data)
-        if update_message_text(formatted_text):
-            log_message("Message successfully updated.")
-        else:
-            log_message("Failed to update message.")
+        data = apply_local_history(data)
+        pages = format_data(data)
+        message_ids = page_message_ids(len(pages))
+
+        def commit(page: Dict[str, Any]) -> None:
+            message_ids[page["page"] - 1] = page["message_id"]
+            remember_sent(page["text"], page["prices"], page["message_id"])
+
+        # Pages are edited one at a time, in order, to stay clear of flood control
+        pipeline = Pipeline(Stage("gate", gate_page), Stage("publish", publish_page))
+        pipeline.run(
+            (
+                {"page": page, "text": text, "prices": price_snapshot(items), "message_id": message_id}
+                for page, ((text, items), message_id) in enumerate(zip(pages, message_ids), 1)
+            ),
+            commit=commit,
+        )
+        remember_message_ids(message_ids)
             
     except Exception as e:
         log_message(f"Fatal error in main execution: {str(e)}")
         raise
+    finally:
+        metrics.write_snapshot()
 
 if __name__ == "__main__":
     try:
@@ -195,3 +417,7 @@ if __name__ == "__main__":
         log_message("Bot stopped by user.")
     except Exception as e:
         log_message(f"Fatal error: {str(e)}")
+        # Profiled runs over a memory budget must still fail the job
+        from common.profiling import MemoryBudgetExceeded
+        if isinstance(e, MemoryBudgetExceeded):
+            raise